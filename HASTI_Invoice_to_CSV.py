@@ -1,27 +1,48 @@
+import argparse
 import csv
 import re
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
-import pdfplumber
-import pandas as pd
 import os
 from datetime import datetime
 import logging
 import sys
-
-try:
-    from PIL import Image, ImageTk
-    HAS_PIL = True
-except ImportError:
-    HAS_PIL = False
-
-# Setup logging to file
-logging.basicConfig(
-    filename='do_invoice_processor.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger()
+import multiprocessing
+import queue
+import threading
+import itertools
+import bisect
+import collections
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+from run_metrics import RunMetrics, StageTimer, format_progress, metrics_path_for, peak_rss_bytes, schedule_startup_probe
+from extraction_cache import ExtractionCache, file_digest
+from field_extractor import FieldSpec, FieldExtractor
+from date_parser import DateParser
+from register_snapshot import load_snapshot, save_snapshot
+from be_index import BEIndex
+from export_index import ExportIndex, split_new
+from watch_folder import FolderWatcher, ProcessedManifest
+from run_journal import RunJournal, journal_path
+from output_writers import OUTPUT_FORMATS, ExtraOutputs, check_formats
+from region_templates import TemplateStore, cropped_text, learn_template
+from invoice_segmenter import InvoiceSegmenter
+import batch_cli
+import log_pipeline
+
+# Heavy dependencies are imported where they are first used: Tk by
+# load_gui(), so the command-line mode runs on hosts without it (or without a
+# display); PIL once the window is up; pandas and pdfplumber by the functions
+# that read files. Startup is measured by benchmarks/startup_benchmark.py.
+tk = filedialog = messagebox = scrolledtext = ttk = None
+
+def load_gui():
+    global tk, filedialog, messagebox, scrolledtext, ttk
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, scrolledtext, ttk
+
+# Setup logging to a rotating file, written by a background thread; the file
+# is opened by the first record, not at import
+logger = log_pipeline.setup_logging('do_invoice_processor.log')
 
 # --- Nagarkot Brand Color Palette ---
 BG_COLOR = "#F4F6F8"
@@ -36,6 +57,36 @@ ERROR_RED = "#D8232A"
 LOG_BG = "#FAFBFC"
 LOG_FG = "#1E1E1E"
 
+# Default number of worker processes for PDF extraction (1 = in-process)
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Bump when text or field extraction changes so cached results are not reused
+PARSER_VERSION = "3"
+
+def app_base_dir():
+    """Folder of the executable when frozen, else of this script."""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+# Set to use another folder for the extraction cache, layout templates and
+# run journals (the benchmarks point it at their work folder)
+CACHE_DIR_ENV = "HASTI_CACHE_DIR"
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(app_base_dir(), "HASTI_Cache")
+
+def default_cache_path():
+    return os.path.join(cache_dir(), "extraction_cache.sqlite")
+
+def default_template_path():
+    return os.path.join(cache_dir(), "templates.json")
+
+# Journal of an unfinished batch over pdf_paths; a rerun over the same PDFs resumes from it
+def run_journal_for(pdf_paths, resume=True):
+    path = journal_path(os.path.join(cache_dir(), "journals"), pdf_paths)
+    return RunJournal(path, pdf_paths, PARSER_VERSION, resume)
+
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller."""
     try:
@@ -44,40 +95,34 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-# Custom handler to display logs in GUI
+# Custom handler to display logs in GUI; it runs on the log_pipeline listener
+# thread and queues the text, which the UI inserts on its own thread
 class TextHandler(logging.Handler):
-    def __init__(self, text_widget):
+    def __init__(self, event_queue):
         super().__init__()
-        self.text_widget = text_widget
+        self.event_queue = event_queue
 
     def emit(self, record):
         try:
-            if self.text_widget.winfo_exists():
-                msg = self.format(record)
-                self.text_widget.config(state='normal')
-                self.text_widget.insert(tk.END, msg + '\n')
-                self.text_widget.config(state='disabled')
-                self.text_widget.see(tk.END)
+            self.event_queue.put(("text", self.format(record)))
         except Exception:
             pass
 
+# Date layouts seen on HASTI invoices; each parses a disjoint set of strings
+INVOICE_DATE_FORMATS = [
+    "%b %d, %Y",  # Jun 13, 2025
+    "%d/%m/%Y",   # 13/06/2025
+    "%d/%b/%Y",   # 13/Jun/2025
+    "%d-%m-%Y",   # 13-06-2025
+    "%d.%m.%Y",   # 13.06.2025
+    "%d-%b-%y",   # 13-Jun-25
+    "%d-%b-%Y"    # 13-Jun-2025
+]
+INVOICE_DATES = DateParser(INVOICE_DATE_FORMATS)
+
 # Function to convert date formats to DD/MM/YYYY or DD-MMM-YYYY
-def convert_date_format(date_str, out_fmt="%d/%m/%Y"):
-    for fmt in [
-        "%b %d, %Y",  # Jun 13, 2025
-        "%d/%m/%Y",   # 13/06/2025
-        "%d/%b/%Y",   # 13/Jun/2025
-        "%d-%m-%Y",   # 13-06-2025
-        "%d.%m.%Y",   # 13.06.2025
-        "%d-%b-%y",   # 13-Jun-25
-        "%d-%b-%Y"    # 13-Jun-2025
-    ]:
-        try:
-            date_obj = datetime.strptime(date_str, fmt)
-            return date_obj.strftime(out_fmt)
-        except ValueError:
-            continue
-    return "Not Found"
+def convert_date_format(date_str, out_fmt="%d/%m/%Y", source=None):
+    return INVOICE_DATES.format(date_str, out_fmt, source)
 
 # Function to clean numeric strings
 def clean_numeric_string(value):
@@ -92,24 +137,327 @@ def clean_numeric_string(value):
             return str(value)
     return str(value)
 
-# Function to extract text from PDF
-def extract_text_from_pdf(pdf_path, log_callback):
-    log_callback(f"Extracting text from {os.path.basename(pdf_path)}...")
+def _amount(match):
+    return match.group(1).replace(',', '')
+
+# HASTI invoice fields. Adding a field here does not add another scan of the text.
+HASTI_FIELDS = FieldExtractor([
+    FieldSpec("invoice_no", "Invoice No", r'Invoice No\.?\s*([A-Z0-9\/\-]+)'),
+    FieldSpec("invoice_date", "Invoice Date", r'Invoice Date\s*([0-9\-]+)'),
+    # BOE No and BOE Date
+    FieldSpec("boe", "BOE No", r'BOE No\.?\s*([0-9]+)-([0-9\-]+)',
+              post=lambda m: (m.group(1), m.group(2)), default=("Not Found", "Not Found")),
+    FieldSpec("bl_no", "BL No", r'BL No\.?\s*([A-Z0-9]+)'),
+    # Charge or GL Amount (Total Amount)
+    FieldSpec("total_amount", "Total Amount", r'Total Amount\s*([0-9,.]+)', post=_amount, default="0"),
+    # CGST/SGST (take from first service line or from summary)
+    FieldSpec("cgst", "CGST", r'CGST\s*[0-9%]*\s*([0-9,.]+)', post=_amount, default="0"),
+    FieldSpec("sgst", "SGST", r'SGST\s*[0-9%]*\s*([0-9,.]+)', post=_amount, default="0"),
+    FieldSpec("total_invoice_amount", "Total Invoice Amount", r'Total Invoice Amount\s*([0-9,.]+)', post=_amount, default="0"),
+    # TRANSPORTATION OF GOODS - ROAD, allowing for up to 100 chars between
+    FieldSpec("is_transport", "TRANSPORTATION", r'TRANSPORTATION\s*OF(.{0,100}?)GOODS\s*-\s*ROAD',
+              flags=re.IGNORECASE | re.DOTALL, post=lambda m: True, default=False),
+])
+
+# Targeted extraction stops reading pages once all of these have matched.
+# The service lines (and so the transport phrase) precede the totals, so
+# they have been read by then.
+REQUIRED_FIELDS = {
+    "invoice_no", "invoice_date", "boe", "bl_no",
+    "total_amount", "total_invoice_amount", "cgst", "sgst",
+}
+
+# Required fields still missing once page_text has been read after
+# previous_text (the page before it). Only those two pages are scanned, so
+# reading a PDF page by page stays linear in its length; the previous page
+# is included for a match that runs across the page break, as one lying
+# wholly within it was found already.
+def _still_missing(missing, previous_text, page_text):
+    return missing - HASTI_FIELDS.extract(previous_text + page_text, missing).keys()
+
+# The phrase itself, which reads the same in any text order
+TRANSPORT_PHRASE = re.compile(r'TRANSPORTATION\s*OF\s*GOODS\s*-\s*ROAD', re.IGNORECASE)
+TRANSPORT_WORD = re.compile(r'TRANSPORTATION', re.IGNORECASE)
+
+# Fields a fast backend's text may give a value for other than pdfplumber's.
+# Their text follows the PDF's drawing order, not the layout order the
+# patterns were written for, so a label can be followed by another label
+# ("Invoice No.\nBL No." gives Invoice No "BL"). A required value is doubted
+# if it has no digit or stops inside a word or number ("9" of "9%"), and
+# is_transport if TRANSPORTATION occurs but not in the plain phrase, as the
+# pattern's 100-character window then depends on the text order.
+def _doubtful_fields(text):
+    found = HASTI_FIELDS.extract(text, REQUIRED_FIELDS)
+    doubtful = set()
+    for name, match in found.items():
+        values = match.value if isinstance(match.value, tuple) else (match.value,)
+        if (not all(any(char.isdigit() for char in value) for value in values)
+                or (match.end < len(text) and not text[match.end].isspace())):
+            doubtful.add(name)
+    if TRANSPORT_WORD.search(text) and not TRANSPORT_PHRASE.search(text):
+        doubtful.add("is_transport")
+    return doubtful
+
+def _table_rows(page):
+    rows = []
+    for table in page.extract_tables() or []:
+        for row in table:
+            rows.append([str(cell) if cell else "" for cell in row])
+    return rows
+
+# Most pages whose parsed layout is kept at once. pdfplumber caches each
+# page's layout objects (several MB for a dense page) until the page is
+# closed, so without a cap a 300-page statement holds gigabytes. Short
+# PDFs stay entirely resident, so the table pass reuses the text pass's
+# layout; in longer ones the oldest page is released as each new one is read.
+PDF_RESIDENT_PAGES = 8
+
+class _PageWindow:
+    def __init__(self, limit=PDF_RESIDENT_PAGES):
+        self.limit = limit
+        self.pages = collections.deque()
+
+    def read(self, page):
+        # Call after reading a page; releases the oldest page over the limit
+        if page in self.pages:
+            return
+        self.pages.append(page)
+        if len(self.pages) > self.limit:
+            self.pages.popleft().close()
+
+# (page index, text) of each page in reading order via PDFium, with no
+# layout analysis and one page open at a time; nothing for a PDF of fewer
+# than min_pages pages. start / stop limit the pages read.
+def _pdfium_pages(pdf_path, timer, min_pages=1, start=0, stop=None):
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        if len(pdf) < min_pages:
+            return
+        timer.count("pages", len(pdf))
+        for index in range(start, len(pdf) if stop is None else min(stop, len(pdf))):
+            timer.count("pages_read")
+            page = pdf[index]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    page_text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+            # PDFium ends lines with \r\n; pdfplumber, whose text the patterns were written for, with \n
+            page_text = page_text.replace("\r\n", "\n").replace("\r", "\n").strip("\n")
+            yield index, (page_text + "\n" if page_text else "")
+    finally:
+        pdf.close()
+
+# Plain text of the pages via PDFium; stops once every required field has
+# matched. Returns (text, missing fields).
+def _pdfium_text(pdf_path, timer):
+    page_texts = []
+    missing = REQUIRED_FIELDS
+    pages = _pdfium_pages(pdf_path, timer)
     try:
-        text = ""
+        for _, page_text in pages:
+            if page_text:
+                with timer("regex"):
+                    missing = _still_missing(missing, page_texts[-1] if page_texts else "", page_text)
+                page_texts.append(page_text)
+            if not missing:
+                break
+    finally:
+        pages.close()
+    return "".join(page_texts), missing
+
+# Field regions learned from earlier PDFs (see region_templates), loaded
+# once per process
+_template_store = None
+
+def template_store():
+    global _template_store
+    if _template_store is None:
+        _template_store = TemplateStore(default_template_path(), PARSER_VERSION)
+    return _template_store
+
+# Text of the regions of the learned template whose page size and
+# letterhead match this PDF's first page. The pages between the first and
+# the last are read in between as PDFium plain text rather than parsed for
+# layout, so fields outside the template (the transport flag, service
+# lines) are still found there. (None, None) if no template matches.
+def _template_text(pdf_path, timer):
+    import pdfplumber
+    store = template_store()
+    if not store:
+        return None, None
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = pdf.pages
+        timer.count("pages", len(pages))
+        template = store.find(pages[0])
+        if template is None:
+            return None, None
+        texts = cropped_text(template, pages)
+        timer.count("pages_read", len(texts))
+        page_count = len(pages)
+    middle = []
+    if page_count > 2:
+        plain = StageTimer()
+        middle = [page_text for _, page_text in _pdfium_pages(pdf_path, plain, start=1, stop=page_count - 1)]
+        timer.count("pages_read", plain.counts.get("pages_read", 0))
+    text = "".join(
+        [texts[0] + "\n" if texts[0] else ""] + middle + [region_text + "\n" for region_text in texts[1:] if region_text]
+    )
+    with timer("regex"):
+        missing = REQUIRED_FIELDS - HASTI_FIELDS.extract(text, REQUIRED_FIELDS).keys()
+    return text, missing
+
+# Learn a template from a PDF pdfplumber has just read in targeted mode:
+# page_starts holds (offset in text, page index) for each page's text.
+# Nothing is learned if a field's line is not on the first or last page.
+def _learn_template(pages, text, page_starts):
+    found = HASTI_FIELDS.extract(text, REQUIRED_FIELDS)
+    if found.keys() != REQUIRED_FIELDS:
+        return None
+    offsets = [start for start, _ in page_starts] + [len(text)]
+    field_hits = {}
+    for name, match in found.items():
+        slot = bisect.bisect_right(offsets, match.start) - 1
+        matched = text[match.start:match.end].strip()
+        # A match running on into the next page has no single region
+        if match.end > offsets[slot + 1] or not matched:
+            return None
+        field_hits[name] = (page_starts[slot][1], matched)
+    template = learn_template(pages, field_hits)
+    if template is not None:
+        template_store().add(template)
+    return template
+
+# Fast text backends, tried in order before pdfplumber. Each takes
+# (pdf_path, timer) and returns (text, missing fields); its text is used
+# only when no required field is missing or doubtful (see
+# _doubtful_fields), else the next backend is tried.
+# When "template" is among those tried, pdfplumber's pass learns the
+# PDF's layout for next time.
+TEXT_BACKENDS = {
+    "pdfium": _pdfium_text,
+    "template": _template_text,
+}
+FAST_TEXT_BACKENDS = ("pdfium", "template")
+
+# Function to extract text from PDF.
+# The fast backends are tried first (targeted mode only) and pdfplumber,
+# which also reads tables, is the fallback; the backend that produced the
+# text is logged and counted in `timer` as backend_<name>. mode="targeted"
+# reads pages until every required field has matched and extracts tables
+# only if a field is still missing afterwards; mode="full" always reads
+# every page's text and tables with pdfplumber. `timer` (a StageTimer), if
+# given, collects the time per stage, the pages / pages read and the
+# process's peak RSS. pdfium_read, if given, is (text, StageTimer, seconds)
+# of a PDFium read of the PDF already made, used in place of the pdfium
+# backend.
+def extract_text_from_pdf(pdf_path, log_callback, mode="targeted", timer=None, backends=FAST_TEXT_BACKENDS,
+                          pdfium_read=None):
+    timer = timer if timer is not None else StageTimer()
+    name = os.path.basename(pdf_path)
+    log_callback(f"Extracting text from {name}...")
+    if mode != "full":
+        for backend in backends:
+            if backend == "pdfium" and pdfium_read is not None:
+                text, attempt, seconds = pdfium_read
+                with attempt("regex"):
+                    missing = REQUIRED_FIELDS - HASTI_FIELDS.extract(text, REQUIRED_FIELDS).keys()
+                timer.add(f"{backend}_text", seconds)
+            else:
+                attempt = StageTimer()
+                started = time.perf_counter()
+                try:
+                    text, missing = TEXT_BACKENDS[backend](pdf_path, attempt)
+                except Exception as e:
+                    # Includes the backend's package not being installed
+                    text, missing = None, None
+                    logger.warning(f"{backend} text extraction failed for {pdf_path}: {e}")
+                timer.add(f"{backend}_text", time.perf_counter() - started)
+            if text and not missing:
+                with attempt("regex"):
+                    doubtful = _doubtful_fields(text)
+                if doubtful:
+                    log_callback(f"{backend} text gives doubtful values for {', '.join(sorted(doubtful))}; "
+                                 "falling back to pdfplumber")
+                    continue
+                timer.count("pages", attempt.counts.get("pages", 0))
+                timer.count("pages_read", attempt.counts.get("pages_read", 0))
+                timer.count(f"backend_{backend}")
+                timer.peak("rss_bytes", peak_rss_bytes())
+                log_callback(f"Text extracted with {backend}")
+                if log_pipeline.verbose():
+                    log_callback(f"Raw extracted text (first 1000 chars): {text[:1000]}")
+                # Same shape as pdfplumber's result: text, a blank line for the (absent) tables
+                return text + "\n", []
+            if missing:
+                log_callback(f"{backend} text is missing {len(missing)} field(s); falling back to pdfplumber")
+    timer.count("backend_pdfplumber")
+    return _pdfplumber_text(pdf_path, log_callback, mode, timer, learn=mode != "full" and "template" in backends)
+
+# page_range, if given, limits the pages read (one invoice of a
+# consolidated PDF); they are not added to the "pages" count.
+def _pdfplumber_text(pdf_path, log_callback, mode, timer, learn=False, page_range=None):
+    import pdfplumber
+    try:
+        page_texts = []
         tables_data = []
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                if page.extract_text():
-                    text += page.extract_text() + "\n"
-                tables = page.extract_tables()
-                if tables:
-                    for table in tables:
-                        for row in table:
-                            row_text = [str(cell) if cell else "" for cell in row]
-                            tables_data.append(row_text)
+        window = _PageWindow()
+        with timer("pdf_open"):
+            pdf = pdfplumber.open(pdf_path)
+            pages = pdf.pages
+        with pdf:
+            if page_range is None:
+                timer.count("pages", len(pages))
+            else:
+                pages = [pages[index] for index in page_range]
+            if mode == "full":
+                for page in pages:
+                    with timer("text_extraction"):
+                        page_text = page.extract_text()
+                    if page_text:
+                        page_texts.append(page_text + "\n")
+                    with timer("table_extraction"):
+                        tables_data.extend(_table_rows(page))
+                    window.read(page)
+                timer.count("pages_read", len(pages))
+            else:
+                missing = REQUIRED_FIELDS
+                page_starts = []
+                offset = 0
+                for page_no, page in enumerate(pages, 1):
+                    timer.count("pages_read")
+                    with timer("text_extraction"):
+                        page_text = page.extract_text()
+                    window.read(page)
+                    if page_text:
+                        page_starts.append((offset, page_no - 1))
+                        with timer("regex"):
+                            missing = _still_missing(missing, page_texts[-1] if page_texts else "", page_text + "\n")
+                        page_texts.append(page_text + "\n")
+                        offset += len(page_texts[-1])
+                    if not missing:
+                        if page_no < len(pages):
+                            log_callback(f"All fields found on page {page_no} of {len(pages)}; skipping remaining pages")
+                        break
+                if missing:
+                    log_callback(f"{len(missing)} field(s) not found in page text; reading tables")
+                    with timer("table_extraction"):
+                        for page in pages:
+                            tables_data.extend(_table_rows(page))
+                            window.read(page)
+            text = "".join(page_texts)
+            if mode != "full" and not missing and learn:
+                with timer("template_learning"):
+                    if _learn_template(pages, text, page_starts) is not None:
+                        log_callback("Learned this layout's field regions")
+        timer.peak("rss_bytes", peak_rss_bytes())
         combined_text = text + "\n" + "\n".join([" ".join(row) for row in tables_data])
-        log_callback(f"Raw extracted text (first 1000 chars): {combined_text[:1000]}")
+        if log_pipeline.verbose():
+            log_callback(f"Raw extracted text (first 1000 chars): {combined_text[:1000]}")
         return combined_text, tables_data
     except Exception as e:
         log_callback(f"Error extracting text from {os.path.basename(pdf_path)}: {str(e)}")
@@ -120,210 +468,845 @@ def extract_invoice_details_with_regex(text, tables_data, log_callback):
     log_callback("Extracting fields for HASTI...")
     results = []
     try:
-        # Extract Invoice No
-        inv_no = re.search(r'Invoice No\.?\s*([A-Z0-9\/\-]+)', text)
-        # Extract Invoice Date
-        inv_date = re.search(r'Invoice Date\s*([0-9\-]+)', text)
-        # Extract BOE No and BOE Date
-        boe_match = re.search(r'BOE No\.?\s*([0-9]+)-([0-9\-]+)', text)
-        if boe_match:
-            boe_no = boe_match.group(1)
-            boe_date = boe_match.group(2)
-        else:
-            boe_no = "Not Found"
-            boe_date = "Not Found"
-        # Extract BL No
-        bl_no = re.search(r'BL No\.?\s*([A-Z0-9]+)', text)
-        # Charge or GL Amount (Total Amount)
-        total_amt = re.search(r'Total Amount\s*([0-9,.]+)', text)
-        # CGST/SGST (take from first service line or from summary)
-        cgst = re.search(r'CGST\s*[0-9%]*\s*([0-9,.]+)', text)
-        sgst = re.search(r'SGST\s*[0-9%]*\s*([0-9,.]+)', text)
-        # Total Invoice Amount
-        total_invoice_amt = re.search(r'Total Invoice Amount\s*([0-9,.]+)', text)
-        # Detect if TRANSPORTATION OF GOODS - ROAD is present (allowing for up to 100 chars between)
-        match = re.search(r'TRANSPORTATION\s*OF(.{0,100}?)GOODS\s*-\s*ROAD', text, re.IGNORECASE | re.DOTALL)
-        is_transport = bool(match)
-        log_callback(f"DEBUG: is_transport={is_transport} (regex match for scattered 'TRANSPORTATION OF ... GOODS - ROAD' with up to 100 chars in between)")
-        if match:
-            log_callback(f"DEBUG: Matched text: {match.group(0)}")
-        else:
-            idx = text.upper().find('TRANSPORTATION')
-            if idx != -1:
-                snippet = text[max(0, idx-200):idx+200]
+        found = HASTI_FIELDS.extract(text)
+        fields = HASTI_FIELDS.values(found)
+        missing = [spec.name for spec in HASTI_FIELDS.specs if spec.name not in found]
+        log_callback(
+            "Matched fields: " + ", ".join(f"{name}@{match.start}" for name, match in found.items())
+            + (f"; not found: {', '.join(missing)}" if missing else "")
+        )
+        boe_no, boe_date = fields["boe"]
+        is_transport = fields["is_transport"]
+        # Text dumps only at DEBUG (--verbose / CONVERTER_LOG_LEVEL=DEBUG)
+        if log_pipeline.verbose():
+            log_callback(f"DEBUG: is_transport={is_transport} (regex match for scattered 'TRANSPORTATION OF ... GOODS - ROAD' with up to 100 chars in between)")
+            if is_transport:
+                match = found["is_transport"]
+                log_callback(f"DEBUG: Matched text: {text[match.start:match.end]}")
             else:
-                snippet = text[:400]
-            log_callback(f"DEBUG: No regex match. Large text snippet: {snippet}")
+                idx = text.upper().find('TRANSPORTATION')
+                if idx != -1:
+                    snippet = text[max(0, idx-200):idx+200]
+                else:
+                    snippet = text[:400]
+                log_callback(f"DEBUG: No regex match. Large text snippet: {snippet}")
 
         # Always extract both Amount and WH Tax Taxable
-        total_invoice_amt_val = total_invoice_amt.group(1).replace(',', '') if total_invoice_amt else "0"
-        total_amt_val = total_amt.group(1).replace(',', '') if total_amt else "0"
+        total_invoice_amt_val = fields["total_invoice_amount"]
+        total_amt_val = fields["total_amount"]
 
         details = {
             "Organization": "HASTI PETRO CHEMICAL & SHIPPING LTD.",
-            "Vendor Inv No": inv_no.group(1) if inv_no else "Not Found",
-            "Vendor Inv Date": inv_date.group(1) if inv_date else "Not Found",
+            "Vendor Inv No": fields["invoice_no"],
+            "Vendor Inv Date": fields["invoice_date"],
             "BOE No": boe_no,
             "BOE Date": boe_date,
-            "BL No": bl_no.group(1) if bl_no else "Not Found",
+            "BL No": fields["bl_no"],
             "Charge or GL Amount": total_invoice_amt_val,  # Default to Total Invoice Amount
             "Amount": total_invoice_amt_val,
             "WH Tax Taxable": total_amt_val,
             "Total Amount": total_amt_val,
             "Total Invoice Amount": total_invoice_amt_val,
-            "CGST": cgst.group(1).replace(',', '') if cgst else "0",
-            "SGST": sgst.group(1).replace(',', '') if sgst else "0",
+            "CGST": fields["cgst"],
+            "SGST": fields["sgst"],
             "Ref No": boe_no,
             "is_transport": is_transport
         }
-        log_callback(f"Extracted HASTI details: {details}")
+        if log_pipeline.verbose():
+            log_callback(f"Extracted HASTI details: {details}")
         results.append(details)
     except Exception as e:
         log_callback(f"Regex extraction error: {e}")
     return results
 
-def create_csv(all_details, output_path, log_callback):
-    fixed_fields = {
-        "Organization Branch": "AHMEDABAD",
-        "Currency": "INR",
-        "ExchRate": "1",
-        "Due Date": "",
-        "Charge or GL": "Charge",
-        "Charge or GL Name": "",
-        "DR or CR": "DR",
-        "Cost Center": "",
-        "Branch": "GUJARAT",
-        " Charge Narration": "",
-        "TaxGroup": "",
-        "Tax Type": "",
-        "SAC or HSN": "996793",
-        "Taxcode1": "",
-        "Taxcode2": "",
-        "Taxcode3": "",
-        "Taxcode4": "",
-        "Taxcode1 Amt": "",
-        "Taxcode2 Amt": "",
-        "Taxcode3 Amt": "",
-        "Taxcode4 Amt": "",
-        "Avail Tax Credit": "",
-        "LOB": "CCL IMP",
-        "Ref Type": "",
-        "Start Date": "",
-        "End Date": "",
-        "WH Tax Code": "1024C",
-        "WH Tax Percentage": "2",
-        "Round Off": "Yes",
-        "CC Code": ""
-    }
-    column_order = [
-        "Entry Date",
-        "Posting Date",
-        "Organization",
-        "Organization Branch",
-        "Vendor Inv No",
-        "Vendor Inv Date",
-        "Currency",
-        "ExchRate",
-        "Narration",
-        "Due Date",
-        "Charge or GL",
-        "Charge or GL Name",
-        "Charge or GL Amount",
-        "DR or CR",
-        "Cost Center",
-        "Branch",
-        " Charge Narration",
-        "TaxGroup",
-        "Tax Type",
-        "SAC or HSN",
-        "Taxcode1",
-        "Taxcode1 Amt",
-        "Taxcode2",
-        "Taxcode2 Amt",
-        "Taxcode3",
-        "Taxcode3 Amt",
-        "Taxcode4",
-        "Taxcode4 Amt",
-        "Avail Tax Credit",
-        "LOB",
-        "Ref Type",
-        "Ref No",
-        "Amount",
-        "Start Date",
-        "End Date",
-        "WH Tax Code",
-        "WH Tax Percentage",
-        "WH Tax Taxable",
-        "WH Tax Amount",
-        "Round Off",
-        "CC Code"
-    ]
-    if not all_details:
-        log_callback("No data to write to CSV.")
-        return False
+# The invoices of a multi-page PDF, read page by page via PDFium (see
+# invoice_segmenter): yields an InvoiceSegment as each invoice's last page
+# is read, so only the current invoice's text is held.
+def _invoice_segments(pdf_path, timer):
+    segmenter = InvoiceSegmenter(HASTI_FIELDS, "invoice_no")
+    pages = _pdfium_pages(pdf_path, timer, min_pages=2)
     try:
-        merged_details = []
-        today_str = datetime.now().strftime("%d-%b-%Y")
-        for row in all_details:
-            merged_row = {**fixed_fields, **row}
-            merged_row["Entry Date"] = today_str
-            merged_row["Posting Date"] = today_str
-            vendor_inv_date = merged_row.get("Vendor Inv Date", "")
-            merged_row["Vendor Inv Date"] = convert_date_format(vendor_inv_date, "%d-%b-%Y") if vendor_inv_date else ""
-            merged_row["Amount"] = row.get("Amount", "0")
-
-            if row.get("is_transport"):
-                merged_row["Charge or GL"] = "Transport Charges FFW _ FCM"
-                merged_row["Charge or GL Name"] = "Transport Charges FFW _ FCM"
-                merged_row["Tax Type"] = "Taxable"
-                merged_row["TaxGroup"] = "GSTIN"
-                merged_row["Avail Tax Credit"] = "100"
-                merged_row["Taxcode1"] = "CGST"
-                merged_row["Taxcode2"] = "SGST"
-                merged_row["Taxcode1 Amt"] = str(round(float(row.get("Total Amount", "0")) * 0.06, 2))
-                merged_row["Taxcode2 Amt"] = str(round(float(row.get("Total Amount", "0")) * 0.06, 2))
-                merged_row["SAC or HSN"] = "996793"
-                merged_row["Charge or GL Amount"] = row.get("Total Amount", "0")
-                merged_row["Amount"] = row.get("Total Amount", "0")
-                merged_row["WH Tax Taxable"] = row.get("Total Amount", "0")
+        for page_index, page_text in pages:
+            segment = segmenter.feed(page_index, page_text)
+            if segment is not None:
+                yield segment
+    finally:
+        pages.close()
+    segment = segmenter.finish()
+    if segment is not None:
+        yield segment
+
+# Records of one invoice of a consolidated PDF. Its pages are read again
+# with pdfplumber (text and tables) if PDFium's text lacks a required field.
+def _segment_details(pdf_path, segment, log_callback, timer):
+    pages = f"pages {segment.first_page + 1}-{segment.last_page + 1}"
+    text, tables_data = segment.text + "\n", []
+    with timer("regex"):
+        missing = REQUIRED_FIELDS - HASTI_FIELDS.extract(text, REQUIRED_FIELDS).keys()
+        if not missing:
+            missing = _doubtful_fields(text)
+    if missing:
+        log_callback(f"pdfium text of the invoice on {pages} is missing or doubtful for {len(missing)} field(s); "
+                     "falling back to pdfplumber")
+        timer.count("segments_pdfplumber")
+        text, tables_data = _pdfplumber_text(pdf_path, log_callback, "full", timer,
+                                             page_range=range(segment.first_page, segment.last_page + 1))
+        if not text:
+            return []
+    log_callback(f"Invoice on {pages}")
+    with timer("regex"):
+        return extract_invoice_details_with_regex(text, tables_data, log_callback)
+
+# Records of a PDF that holds several invoices (as a merged PDF does), one
+# per invoice, each built as soon as its pages have been read. The PDF's
+# whole text is never held, so merged PDFs of hundreds of invoices are
+# read in one pass in bounded memory. Returns (details_list, None, complete),
+# complete being False if reading failed after some invoices, or
+# (None, pdfium_read, True) if the PDF holds a single invoice, for the usual
+# path: pdfium_read is the scan's (text, StageTimer, seconds) for
+# extract_text_from_pdf, so the PDF is not read with PDFium twice, or None
+# if there was no scan (one page) or PDFium could not read the PDF.
+def _consolidated_invoices(pdf_path, log_callback, timer):
+    scan = StageTimer()
+    details_list = []
+    first = None
+    complete = True
+    started = time.perf_counter()
+    try:
+        for segment in _invoice_segments(pdf_path, scan):
+            if first is None and not details_list:
+                # Held until a second invoice shows the PDF is consolidated
+                first = segment
+                continue
+            if first is not None:
+                log_callback(f"{os.path.basename(pdf_path)} holds several invoices; extracting each")
+                details_list.extend(_segment_details(pdf_path, first, log_callback, scan))
+                first = None
+            details_list.extend(_segment_details(pdf_path, segment, log_callback, scan))
+    except Exception as e:
+        if not details_list:
+            # Includes pypdfium2 not being installed
+            logger.warning(f"pdfium invoice scan failed for {pdf_path}: {e}")
+            timer.add("invoice_scan", time.perf_counter() - started)
+            return None, None, True
+        complete = False
+        log_callback(f"Error reading {os.path.basename(pdf_path)} after {len(details_list)} invoice(s): {e}")
+        logger.error(f"Consolidated PDF {pdf_path} failed after {len(details_list)} invoices: {e}")
+    if not details_list:
+        # One invoice (or none): its text stands in for the pdfium backend's read
+        if first is None:
+            return None, None, True
+        return None, (first.text, scan, time.perf_counter() - started), True
+    timer.merge(scan)
+    timer.count("backend_pdfium")
+    timer.count("invoices", len(details_list))
+    timer.peak("rss_bytes", peak_rss_bytes())
+    log_callback(f"Extracted {len(details_list)} invoices from {os.path.basename(pdf_path)}")
+    return details_list, None, complete
+
+# Extract all invoice records from one PDF; failures are logged and give [],
+# or, for a consolidated PDF that fails partway, the invoices read before.
+# Returns (details_list, text, tables_data, timer); text is None on failure,
+# and "" for a consolidated PDF, whose text is never held whole.
+def extract_invoice_file(pdf_path, log_callback):
+    name = os.path.basename(pdf_path)
+    logger.info(f"Processing {pdf_path}")
+    timer = StageTimer()
+    try:
+        timer.count("bytes", os.path.getsize(pdf_path))
+        details_list, pdfium_read, complete = _consolidated_invoices(pdf_path, log_callback, timer)
+        if details_list is not None:
+            return details_list, "" if complete else None, [], timer
+        text, tables_data = extract_text_from_pdf(pdf_path, log_callback, timer=timer, pdfium_read=pdfium_read)
+        if not text:
+            log_callback(f"Failed to extract text from {name}")
+            logger.error(f"Text extraction failed for {pdf_path}")
+            return [], None, [], timer
+        with timer("regex"):
+            details_list = extract_invoice_details_with_regex(text, tables_data, log_callback)
+        if not details_list:
+            log_callback(f"No valid data extracted from {name}")
+            logger.warning(f"No valid data extracted from {pdf_path}")
+        return details_list, text, tables_data, timer
+    except Exception as e:
+        log_callback(f"Failed to process {name}: {str(e)}")
+        logger.error(f"Processing failed for {pdf_path}: {e}")
+        return [], None, [], timer
+
+def _extract_invoice_file_worker(pdf_path):
+    # Runs in a pool process: log messages are collected and replayed by the parent
+    messages = []
+    return extract_invoice_file(pdf_path, messages.append), messages
+
+def _parse_files(pdf_paths, log_callback, workers):
+    # Yield extract_invoice_file results in input order, serially or in a process pool
+    workers = min(workers, len(pdf_paths))
+    if workers <= 1:
+        for pdf_path in pdf_paths:
+            log_callback(f"Processing {os.path.basename(pdf_path)}")
+            yield extract_invoice_file(pdf_path, log_callback)
+        return
+    log_callback(f"Extracting {len(pdf_paths)} PDFs with {workers} worker processes")
+    initializer, initargs = log_pipeline.worker_initializer()
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        futures = [pool.submit(_extract_invoice_file_worker, pdf_path) for pdf_path in pdf_paths]
+        try:
+            for pdf_path, future in zip(pdf_paths, futures):
                 try:
-                    merged_row["WH Tax Amount"] = str(round(float(merged_row["WH Tax Taxable"]) * 0.02, 2))
-                except Exception:
-                    merged_row["WH Tax Amount"] = "0"
+                    result, messages = future.result()
+                except Exception as e:
+                    messages = [f"Failed to process {os.path.basename(pdf_path)}: {str(e)}"]
+                    logger.error(f"Processing failed for {pdf_path}: {e}")
+                    result = [], None, [], StageTimer()
+                log_callback(f"Processing {os.path.basename(pdf_path)}")
+                for message in messages:
+                    log_callback(message)
+                yield result
+        finally:
+            for future in futures:
+                future.cancel()
+
+def extract_invoice_files(pdf_paths, log_callback, workers=1, cache=None, metrics=None):
+    """Yield (pdf_path, details_list, complete) for each PDF, in input order.
+
+    PDFs are identified by the SHA-256 of their bytes: results come from the
+    ExtractionCache when present, and byte-identical PDFs in one batch are
+    parsed once. The rest are parsed in a process pool when workers > 1. A
+    file that fails, or a worker that dies, yields an empty list for that
+    file only, or the invoices read before a consolidated PDF failed, with
+    complete False; such results are not cached. Closing the generator
+    early cancels PDFs not started yet.
+    Each file's stage times are added to `metrics` (a RunMetrics), if given.
+    """
+    keys = []
+    hash_seconds = []
+    for pdf_path in pdf_paths:
+        started = time.perf_counter()
+        try:
+            keys.append(file_digest(pdf_path))
+        except OSError:
+            # Unreadable files are parsed on their own so the usual error is logged
+            keys.append(pdf_path)
+        hash_seconds.append(time.perf_counter() - started)
+
+    done = {}
+    failed = set()
+    first_path = {}
+    cache_seconds = {}
+    to_parse = []
+    for pdf_path, key in zip(pdf_paths, keys):
+        if key in first_path:
+            continue
+        first_path[key] = pdf_path
+        cached = None
+        if cache is not None and key != pdf_path:
+            started = time.perf_counter()
+            cached = cache.get(key)
+            cache_seconds[key] = time.perf_counter() - started
+        if cached is not None:
+            done[key] = cached["details"]
+        else:
+            to_parse.append(pdf_path)
+
+    parsed = _parse_files(to_parse, log_callback, workers)
+    try:
+        for pdf_path, key, hashed in zip(pdf_paths, keys, hash_seconds):
+            name = os.path.basename(pdf_path)
+            timer = None
+            if key in done:
+                log_callback(f"Processing {name}")
+                if first_path[key] != pdf_path:
+                    log_callback(f"{name} is identical to {os.path.basename(first_path[key])}; reusing its extraction")
+                    source = "duplicate"
+                else:
+                    log_callback(f"Loaded {name} from extraction cache")
+                    source = "cache"
             else:
-                # --- CFS CHARGES (1) Block ---
-                merged_row["Charge or GL Name"] = "CFS CHARGES (1)"
-                merged_row["Tax Type"] = "Pure Agent"
-                merged_row["TaxGroup"] = "GSTIN"
-                merged_row["Avail Tax Credit"] = "No"
-                merged_row["Taxcode1"] = ""
-                merged_row["Taxcode2"] = ""
-                merged_row["Taxcode1 Amt"] = ""
-                merged_row["Taxcode2 Amt"] = ""
-                merged_row["SAC or HSN"] = "996711"
-                merged_row["Charge or GL Amount"] = row.get("Amount", "0")
-                merged_row["WH Tax Taxable"] = row.get("WH Tax Taxable", "0")
+                details_list, text, tables_data, timer = next(parsed)
+                done[key] = details_list
+                source = "parsed"
+                if text is None:
+                    failed.add(key)
+                elif cache is not None and key != pdf_path:
+                    with timer("cache_store"):
+                        cache.put(key, text, tables_data, details_list)
+            if metrics is not None:
+                if timer is None:
+                    timer = StageTimer()
+                    timer.count("bytes", _file_size(pdf_path))
+                if source != "duplicate" and key in cache_seconds:
+                    timer.add("cache_lookup", cache_seconds[key])
+                timer.add("hash", hashed)
+                metrics.add_file(pdf_path, timer, source, records=len(done[key]))
+            # Copies, because callers fill in per-row fields such as Ref No
+            yield pdf_path, [dict(details) for details in done[key]], key not in failed
+    finally:
+        parsed.close()
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+# Bump when load_job_register's parsing changes so saved snapshots are rebuilt
+JOB_REGISTER_SNAPSHOT_VERSION = "1"
+
+# Job register as a BEIndex; empty if it cannot be read
+def load_job_register(job_register_path, log_callback):
+    pairs = load_snapshot(job_register_path, "hasti", JOB_REGISTER_SNAPSHOT_VERSION)
+    if pairs is not None:
+        log_callback(f"Loaded {len(pairs)} job register entries (from snapshot).")
+        return BEIndex(pairs)
+    pairs = _read_job_register(job_register_path, log_callback)
+    if pairs and not save_snapshot(job_register_path, "hasti", JOB_REGISTER_SNAPSHOT_VERSION, pairs):
+        logger.warning(f"Could not save job register snapshot for {job_register_path}")
+    return BEIndex(pairs)
+
+# Read the BE No / Job No columns of a job register as [be_no, job_no] pairs;
+# [] if it cannot be read
+def _read_job_register(job_register_path, log_callback):
+    import pandas as pd
+    try:
+        if job_register_path.endswith('.csv'):
+            df = pd.read_csv(job_register_path, dtype=str)
+        else:
+            df = pd.read_excel(job_register_path, dtype=str)
+        df.columns = [c.strip().lower() for c in df.columns]
+        be_col = 'be no'
+        job_col = 'job no'
+        pairs = []
+        for _, row in df.iterrows():
+            pairs.append([
+                str(row.get(be_col, '')).strip(),
+                str(row.get(job_col, '')).strip(),
+            ])
+        log_callback(f"Loaded {len(pairs)} job register entries.")
+        return pairs
+    except Exception as e:
+        log_callback(f"Failed to load job register: {e}")
+        return []
+
+def match_job_no_by_be(job_register, be_no):
+    job_no = job_register.lookup(be_no)
+    return job_no if job_no is not None else 'No match found'
+
+# Fill in each record's Ref No from the job register; unmatched BOE numbers
+# are logged with the register's nearest BE numbers, if any
+def assign_job_numbers(details_list, job_register, log_callback=None):
+    for details in details_list:
+        be_no = details.get("BOE No", "")
+        details["Ref No"] = match_job_no_by_be(job_register, be_no)
+        if details["Ref No"] == 'No match found' and log_callback is not None:
+            suggestions = job_register.suggest(be_no)
+            if suggestions:
+                log_callback(f"No job number for BOE No {be_no}; closest in the job register: "
+                             + ", ".join(f"{near_be} ({job_no})" for near_be, job_no in suggestions))
+
+class BatchResult(NamedTuple):
+    outcome: str            # "success", "cancelled", "no_data" or "write_failed"
+    records: int
+    files_done: int
+    files_without_records: int
+    already_exported: int = 0
+
+# Append mode: records already exported (by Vendor Inv No + BOE No) are skipped
+EXPORT_INDEX_NAME = "exported_keys.sqlite"
+
+def export_index_path(output_csv):
+    return os.path.join(os.path.dirname(os.path.abspath(output_csv)), EXPORT_INDEX_NAME)
+
+def export_key(details):
+    # None when either field was not extracted, so such records are never merged
+    invoice_no = str(details.get("Vendor Inv No", "")).strip()
+    boe_no = str(details.get("BOE No", "")).strip()
+    if invoice_no in ("", "Not Found") or boe_no in ("", "Not Found"):
+        return None
+    return f"{invoice_no}|{boe_no}"
+
+# Drop the records already in export_index; returns (records, keys to record).
+# Batch and watch runs both de-duplicate through here.
+def _unexported(details_list, export_index, log_callback):
+    new_details, keys, skipped = split_new(details_list, export_key, export_index)
+    if skipped:
+        log_callback(f"Skipping {skipped} record(s) already exported")
+    return new_details, keys
+
+def process_invoice_batch(pdf_paths, output_csv, job_register, log_callback, workers=1, cache=None,
+                          progress_callback=None, cancel_event=None, metrics=None, export_index=None, journal=None,
+                          output_formats=()):
+    """Extract every PDF, map BOE numbers to job numbers and write the CSV.
+
+    Each PDF's rows are written and flushed as soon as it is parsed, so
+    memory does not grow with the batch and a crash keeps the rows already
+    written. progress_callback(files_done, files_total, elapsed) runs after
+    each PDF; setting cancel_event stops between PDFs and removes the
+    partial CSV. Stage times are recorded in `metrics` (a RunMetrics), if
+    given. With an export_index (an ExportIndex), records already exported
+    are skipped and the rest are appended to output_csv and added to the
+    index; a cancelled append keeps the rows it wrote. With a journal (a
+    RunJournal), each finished PDF is journalled and PDFs an interrupted
+    run already finished are not parsed again: their journalled records are
+    written as if just parsed, so when appending, those the interrupted run
+    already exported are skipped by the export index. The rows also go to a
+    file per extra output format (e.g. "parquet") beside output_csv.
+    """
+    metrics = metrics if metrics is not None else RunMetrics("hasti")
+    started = time.perf_counter()
+    total = len(pdf_paths)
+    append = export_index is not None
+    output_name = os.path.basename(output_csv)
+    # PDFs are parsed (optionally in worker processes); job mapping and writing stay here
+    done = 0
+    extracted = 0
+    without_records = 0
+    already_exported = 0
+    writer = InvoiceCSVWriter(output_csv, append, output_formats)
+    resumed = []
+    if journal is not None:
+        for pdf_path in pdf_paths:
+            records = journal.completed(pdf_path)
+            if records is not None:
+                resumed.append((pdf_path, records, True))
+        if resumed:
+            log_callback(f"Resuming an interrupted run: {len(resumed)} of {total} files were already done")
+            logger.info(f"Resuming from {journal.path}: {len(resumed)} of {total} files already done")
+            resumed_paths = {pdf_path for pdf_path, _, _ in resumed}
+            pdf_paths = [pdf_path for pdf_path in pdf_paths if pdf_path not in resumed_paths]
+    files = extract_invoice_files(pdf_paths, log_callback, workers, cache, metrics)
+    try:
+        for done, (pdf_path, details_list, complete) in enumerate(itertools.chain(resumed, files), 1):
+            # Journalled records go through the export index like fresh ones, as the
+            # interrupted run may not have been appending to this CSV
+            from_journal = done <= len(resumed)
+            with metrics("job_lookup", file=pdf_path):
+                assign_job_numbers(details_list, job_register, log_callback)
+            extracted += len(details_list)
+            if details_list:
+                log_callback(f"Processed {os.path.basename(pdf_path)}: {len(details_list)} records extracted")
+                logger.info(f"Processed {pdf_path}: {len(details_list)} records extracted")
+            else:
+                without_records += 1
+            if journal is not None and not from_journal:
+                journalled = [dict(details) for details in details_list]
+            if append and details_list:
+                extracted_count = len(details_list)
+                with metrics("export_index", file=pdf_path):
+                    details_list, keys = _unexported(details_list, export_index, log_callback)
+                already_exported += extracted_count - len(details_list)
+            if details_list:
                 try:
-                    merged_row["WH Tax Amount"] = str(round(float(merged_row["WH Tax Taxable"]) * 0.02, 2))
-                except Exception:
-                    merged_row["WH Tax Amount"] = "0"
-
-            merged_row["Narration"] = f"BEING CHARGES PAID TO HASTI PETRO CHEMICAL A/C ADVICS {merged_row.get('Ref No', '')}"
-            for col in column_order:
-                if col not in merged_row:
-                    merged_row[col] = ""
-            merged_details.append(merged_row)
-        with open(output_path, mode='w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=column_order)
-            writer.writeheader()
-            for row in merged_details:
-                writer.writerow({col: row.get(col, "") for col in column_order})
-        log_callback(f"CSV successfully written to {output_path}")
+                    with metrics("csv_write", file=pdf_path):
+                        writer.write(details_list)
+                except Exception as e:
+                    log_callback(f"Failed to write CSV: {e}")
+                    logger.error(f"Failed to write {output_csv}: {e}")
+                    writer.close()
+                    log_callback("Failed to generate CSV")
+                    return _finish_batch(metrics, BatchResult("write_failed", writer.records, done, without_records, already_exported))
+                if append:
+                    with metrics("export_index", file=pdf_path):
+                        export_index.add(keys, output_name)
+            # Last, so a file is only journalled once its rows are in the CSV; one
+            # that failed is not, so a rerun parses it again
+            if journal is not None and not from_journal and complete:
+                journal.add(pdf_path, journalled)
+            if progress_callback:
+                progress_callback(done, total, time.perf_counter() - started)
+            if cancel_event is not None and cancel_event.is_set():
+                break
+    finally:
+        files.close()
+        writer.close()
+
+    metrics.count("records", writer.records)
+    backends = {name[len("backend_"):]: count for name, count in metrics.counts.items() if name.startswith("backend_")}
+    if backends:
+        log_callback("Text extracted with " + ", ".join(f"{name} ({count} files)" for name, count in sorted(backends.items())))
+    if already_exported:
+        log_callback(f"Skipped {already_exported} record(s) already exported")
+
+    if cancel_event is not None and cancel_event.is_set():
+        if append:
+            log_callback(f"Processing cancelled after {done} of {total} files; {writer.records} records appended")
+        else:
+            writer.discard()
+            log_callback(f"Processing cancelled after {done} of {total} files; no CSV written")
+        logger.info(f"Processing cancelled after {done} of {total} files")
+        return _finish_batch(metrics, BatchResult("cancelled", writer.records if append else 0, done, without_records, already_exported))
+
+    if journal is not None:
+        journal.finish()
+    if not extracted:
+        log_callback("No valid data extracted from PDFs")
+        return _finish_batch(metrics, BatchResult("no_data", 0, done, without_records))
+
+    if not writer.records:
+        log_callback(f"All {extracted} records were already exported; nothing appended")
+        return _finish_batch(metrics, BatchResult("success", 0, done, without_records, already_exported))
+
+    if append:
+        log_callback(f"Appended {writer.records} records to {output_csv}")
+    else:
+        log_callback(f"CSV successfully written to {output_csv}")
+    log_callback(f"CSV generated with {writer.records} records: {output_name}")
+    return _finish_batch(metrics, BatchResult("success", writer.records, done, without_records, already_exported))
+
+# Write the run summary (JSON) and Prometheus textfile; failures are only logged
+def save_metrics(metrics, json_path, prometheus_path, log_callback):
+    try:
+        if json_path:
+            metrics.write_json(json_path)
+        if prometheus_path:
+            metrics.write_prometheus(prometheus_path)
+    except OSError as e:
+        log_callback(f"Could not write run metrics: {e}")
+        logger.error(f"Could not write run metrics: {e}")
+
+def _finish_batch(metrics, result):
+    metrics.finish(result.outcome)
+    logger.info(f"Batch {result.outcome} in {metrics.duration:.1f}s; stage times: {metrics.stage_report()}")
+    return result
+
+# Logisys columns, in order, and the values that are the same for every row
+CSV_FIXED_FIELDS = {
+    "Organization Branch": "AHMEDABAD",
+    "Currency": "INR",
+    "ExchRate": "1",
+    "Due Date": "",
+    "Charge or GL": "Charge",
+    "Charge or GL Name": "",
+    "DR or CR": "DR",
+    "Cost Center": "",
+    "Branch": "GUJARAT",
+    " Charge Narration": "",
+    "TaxGroup": "",
+    "Tax Type": "",
+    "SAC or HSN": "996793",
+    "Taxcode1": "",
+    "Taxcode2": "",
+    "Taxcode3": "",
+    "Taxcode4": "",
+    "Taxcode1 Amt": "",
+    "Taxcode2 Amt": "",
+    "Taxcode3 Amt": "",
+    "Taxcode4 Amt": "",
+    "Avail Tax Credit": "",
+    "LOB": "CCL IMP",
+    "Ref Type": "",
+    "Start Date": "",
+    "End Date": "",
+    "WH Tax Code": "1024C",
+    "WH Tax Percentage": "2",
+    "Round Off": "Yes",
+    "CC Code": ""
+}
+
+CSV_COLUMNS = [
+    "Entry Date",
+    "Posting Date",
+    "Organization",
+    "Organization Branch",
+    "Vendor Inv No",
+    "Vendor Inv Date",
+    "Currency",
+    "ExchRate",
+    "Narration",
+    "Due Date",
+    "Charge or GL",
+    "Charge or GL Name",
+    "Charge or GL Amount",
+    "DR or CR",
+    "Cost Center",
+    "Branch",
+    " Charge Narration",
+    "TaxGroup",
+    "Tax Type",
+    "SAC or HSN",
+    "Taxcode1",
+    "Taxcode1 Amt",
+    "Taxcode2",
+    "Taxcode2 Amt",
+    "Taxcode3",
+    "Taxcode3 Amt",
+    "Taxcode4",
+    "Taxcode4 Amt",
+    "Avail Tax Credit",
+    "LOB",
+    "Ref Type",
+    "Ref No",
+    "Amount",
+    "Start Date",
+    "End Date",
+    "WH Tax Code",
+    "WH Tax Percentage",
+    "WH Tax Taxable",
+    "WH Tax Amount",
+    "Round Off",
+    "CC Code"
+]
+
+# One Logisys CSV row from an invoice's extracted details
+def merge_row(row, today_str):
+    merged_row = {**CSV_FIXED_FIELDS, **row}
+    merged_row["Entry Date"] = today_str
+    merged_row["Posting Date"] = today_str
+    vendor_inv_date = row.get("Vendor Inv Date") or ""
+    merged_row["Vendor Inv Date"] = (
+        INVOICE_DATES.format(vendor_inv_date, "%d-%b-%Y", source="Vendor Inv Date") if vendor_inv_date else ""
+    )
+    merged_row["Amount"] = row.get("Amount", "0")
+
+    if row.get("is_transport"):
+        merged_row["Charge or GL"] = "Transport Charges FFW _ FCM"
+        merged_row["Charge or GL Name"] = "Transport Charges FFW _ FCM"
+        merged_row["Tax Type"] = "Taxable"
+        merged_row["TaxGroup"] = "GSTIN"
+        merged_row["Avail Tax Credit"] = "100"
+        merged_row["Taxcode1"] = "CGST"
+        merged_row["Taxcode2"] = "SGST"
+        merged_row["Taxcode1 Amt"] = str(round(float(row.get("Total Amount", "0")) * 0.06, 2))
+        merged_row["Taxcode2 Amt"] = str(round(float(row.get("Total Amount", "0")) * 0.06, 2))
+        merged_row["SAC or HSN"] = "996793"
+        merged_row["Charge or GL Amount"] = row.get("Total Amount", "0")
+        merged_row["Amount"] = row.get("Total Amount", "0")
+        merged_row["WH Tax Taxable"] = row.get("Total Amount", "0")
+        try:
+            merged_row["WH Tax Amount"] = str(round(float(merged_row["WH Tax Taxable"]) * 0.02, 2))
+        except Exception:
+            merged_row["WH Tax Amount"] = "0"
+    else:
+        # --- CFS CHARGES (1) Block ---
+        merged_row["Charge or GL Name"] = "CFS CHARGES (1)"
+        merged_row["Tax Type"] = "Pure Agent"
+        merged_row["TaxGroup"] = "GSTIN"
+        merged_row["Avail Tax Credit"] = "No"
+        merged_row["Taxcode1"] = ""
+        merged_row["Taxcode2"] = ""
+        merged_row["Taxcode1 Amt"] = ""
+        merged_row["Taxcode2 Amt"] = ""
+        merged_row["SAC or HSN"] = "996711"
+        merged_row["Charge or GL Amount"] = row.get("Amount", "0")
+        merged_row["WH Tax Taxable"] = row.get("WH Tax Taxable", "0")
+        try:
+            merged_row["WH Tax Amount"] = str(round(float(merged_row["WH Tax Taxable"]) * 0.02, 2))
+        except Exception:
+            merged_row["WH Tax Amount"] = "0"
+
+    merged_row["Narration"] = f"BEING CHARGES PAID TO HASTI PETRO CHEMICAL A/C ADVICS {merged_row.get('Ref No', '')}"
+    return {col: merged_row.get(col, "") for col in CSV_COLUMNS}
+
+def iter_csv_rows(all_details, today_str=None):
+    """Yield the CSV row of each detail dict, as it is consumed."""
+    today_str = today_str or datetime.now().strftime("%d-%b-%Y")
+    for row in all_details:
+        yield merge_row(row, today_str)
+
+class InvoiceCSVWriter:
+    """Writes CSV rows as they are produced, flushing after every write().
+
+    The file is opened on the first write(), so a batch with no records
+    leaves no file behind. With append=True rows go after the existing ones
+    (header only if the file is new) and each write() is fsynced, since the
+    file is shared by runs. After a crash, every row written before it is
+    in the file. The same rows go to the extra output `formats` (see
+    output_writers), if any.
+    """
+
+    def __init__(self, output_path, append=False, formats=()):
+        self.output_path = output_path
+        self.append = append
+        self.records = 0
+        self.extra = ExtraOutputs(output_path, formats, CSV_COLUMNS, append)
+        self._file = None
+        self._writer = None
+
+    def write(self, details_list):
+        if not details_list:
+            return
+        if self._file is None:
+            write_header = not self.append or not os.path.isfile(self.output_path) or os.path.getsize(self.output_path) == 0
+            self._file = open(self.output_path, mode='a' if self.append else 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=CSV_COLUMNS)
+            if write_header:
+                self._writer.writeheader()
+        today_str = datetime.now().strftime("%d-%b-%Y")
+        extra_rows = []
+        for row in iter_csv_rows(details_list, today_str):
+            self._writer.writerow(row)
+            self.records += 1
+            if self.extra:
+                extra_rows.append(list(row.values()))
+        self._file.flush()
+        if self.append:
+            os.fsync(self._file.fileno())
+        self.extra.write(extra_rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.extra.close()
+
+    def discard(self):
+        """Close and delete the files, unless they were appended to."""
+        self.close()
+        if self.records and not self.append and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        self.extra.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# append=True adds the rows to an existing CSV (header only if it is new);
+# output_formats are extra files written beside it (see output_writers)
+def create_csv(all_details, output_path, log_callback, append=False, output_formats=()):
+    if not all_details:
+        log_callback("No data to write to CSV.")
+        return False
+    try:
+        with InvoiceCSVWriter(output_path, append, output_formats) as writer:
+            writer.write(all_details)
+        if append:
+            log_callback(f"Appended {writer.records} records to {output_path}")
+        else:
+            log_callback(f"CSV successfully written to {output_path}")
         return True
     except Exception as e:
         log_callback(f"Failed to write CSV: {e}")
         return False
 
+# Seconds a PDF in the watched inbox must stay unchanged before it is read
+WATCH_SETTLE_SECONDS = 3.0
+
+# A fully written PDF ends with an %%EOF marker (possibly followed by whitespace)
+def _pdf_has_trailer(pdf_path):
+    try:
+        with open(pdf_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 1024))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+def daily_output_path(output_dir):
+    # Rolling output of watch and append runs: one CSV per day
+    return os.path.join(output_dir, f"Hasti_{datetime.now().strftime('%Y-%m-%d')}.csv")
+
+def watch_inbox(inbox, job_register_path, output_dir, log_callback, manifest_path=None, workers=1, cache=None,
+                interval=2.0, settle_seconds=WATCH_SETTLE_SECONDS, stop_event=None, once=False,
+                metrics_json=None, prometheus_path=None, output_formats=()):
+    """Convert PDFs as they arrive in `inbox`, appending their records to a daily CSV.
+
+    Every converted PDF (including ones that gave no records) is recorded by
+    content digest in the manifest, so restarts and renamed copies are not
+    converted again. Records already exported (by this watch or an append
+    run into the same folder) are skipped. The job register is re-read when it changes. Runs until
+    stop_event is set, or with once=True until the PDFs already in the inbox
+    are done. After each batch of arrivals, the stage metrics since the watch
+    started are written to metrics_json and prometheus_path, if given.
+    output_formats (appendable ones, e.g. "csv.gz") get the same rows.
+    """
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir, "watch_manifest.jsonl")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = ProcessedManifest(manifest_path)
+    watcher = FolderWatcher(inbox, (".pdf",), settle_seconds, is_complete=_pdf_has_trailer)
+    stop_event = stop_event or threading.Event()
+    register_stamp = None
+    job_register = BEIndex([])
+    # The last 1000 files are kept in the JSON summary; totals cover the whole watch
+    metrics = RunMetrics("hasti_watch", max_files=1000)
+    log_callback(f"Watching {inbox} ({len(manifest)} PDFs already converted)")
+    logger.info(f"Watching {inbox}; output in {output_dir}; manifest {manifest_path}")
+
+    export_index = ExportIndex(os.path.join(output_dir, EXPORT_INDEX_NAME))
+    try:
+        while True:
+            arrivals = []
+            digests = set()
+            for pdf_path in watcher.poll():
+                try:
+                    digest = file_digest(pdf_path)
+                except OSError as e:
+                    log_callback(f"Cannot read {os.path.basename(pdf_path)}: {e}")
+                    watcher.retry(pdf_path)
+                    continue
+                if digest in manifest or digest in digests:
+                    log_callback(f"Skipping {os.path.basename(pdf_path)}: already converted")
+                    continue
+                digests.add(digest)
+                arrivals.append((pdf_path, digest))
+
+            if arrivals:
+                try:
+                    stat = os.stat(job_register_path)
+                    stamp = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    stamp = None
+                if stamp != register_stamp:
+                    with metrics("register_load"):
+                        job_register = load_job_register(job_register_path, log_callback)
+                    register_stamp = stamp
+                ok = _convert_arrivals(arrivals, job_register, output_dir, manifest, export_index, watcher,
+                                       log_callback, workers, cache, metrics, output_formats)
+                metrics.outcome = "success" if ok else "write_failed"
+                save_metrics(metrics, metrics_json, prometheus_path, log_callback)
+
+            if once and not watcher.pending:
+                break
+            if stop_event.wait(interval):
+                break
+    finally:
+        export_index.close()
+    log_callback("Stopped watching")
+
+# Returns False if any PDF's records could not be appended (it will be retried)
+def _convert_arrivals(arrivals, job_register, output_dir, manifest, export_index, watcher, log_callback, workers, cache,
+                      metrics, output_formats=()):
+    all_written = True
+    files = extract_invoice_files([pdf_path for pdf_path, _ in arrivals], log_callback, workers, cache, metrics)
+    try:
+        for (pdf_path, details_list, complete), (_, digest) in zip(files, arrivals):
+            name = os.path.basename(pdf_path)
+            output_csv = ""
+            if not details_list:
+                # Not recorded as converted, so a restarted watch (e.g. after a parser fix) tries it again
+                log_callback(f"No records from {name}; it will be retried when the watch restarts")
+                logger.warning(f"No records from watched PDF {pdf_path}; not recorded in the manifest")
+                continue
+            with metrics("job_lookup", file=pdf_path):
+                assign_job_numbers(details_list, job_register, log_callback)
+            with metrics("export_index", file=pdf_path):
+                details_list, keys = _unexported(details_list, export_index, log_callback)
+            if details_list:
+                output_csv = daily_output_path(output_dir)
+                with metrics("csv_write", file=pdf_path):
+                    written = create_csv(details_list, output_csv, log_callback, append=True,
+                                         output_formats=output_formats)
+                if not written:
+                    # e.g. the CSV is open in Excel; the PDF is picked up again
+                    log_callback(f"Could not append {name}; will retry")
+                    watcher.retry(pdf_path)
+                    all_written = False
+                    continue
+                with metrics("export_index", file=pdf_path):
+                    export_index.add(keys, os.path.basename(output_csv))
+                metrics.count("records", len(details_list))
+                logger.info(f"Converted {pdf_path}: {len(details_list)} records -> {output_csv}")
+            if not complete:
+                # Read only in part; its appended records are skipped by the export index on the retry
+                log_callback(f"{name} was only read in part; it will be retried when the watch restarts")
+                logger.warning(f"Watched PDF {pdf_path} was only read in part; not recorded in the manifest")
+                continue
+            manifest.add(digest, name=name, records=len(details_list), output=os.path.basename(output_csv))
+    finally:
+        files.close()
+    return all_written
+
 class DOInvoiceApp:
     def __init__(self, root):
         self.root = root
@@ -340,9 +1323,14 @@ class DOInvoiceApp:
         # Variables
         self.pdf_paths = []
         self.job_register_path = None
-        self.job_register = []
+        self.job_register = BEIndex([])
         self._logo_image = None
 
+        # Background processing: the worker thread posts events, the UI drains them
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
+
         # Setup Styles
         self._setup_styles()
 
@@ -350,9 +1338,29 @@ class DOInvoiceApp:
         self._create_widgets()
 
         # Logging Setup
-        text_handler = TextHandler(self.log_text)
+        text_handler = TextHandler(self.events)
         text_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        logger.addHandler(text_handler)
+        log_pipeline.add_sink(text_handler)
+
+        self.root.after(100, self._drain_events)
+        # Runs once the window has been drawn
+        self.root.after_idle(self._load_logo)
+
+    # Load the logo with PIL, falling back to the text label if either is missing
+    def _load_logo(self):
+        logo_path = resource_path("logo.png")
+        if not os.path.isfile(logo_path):
+            return
+        try:
+            from PIL import Image, ImageTk
+            img = Image.open(logo_path)
+            h = 40
+            w = int(img.width * h / img.height)
+            img = img.resize((w, h), Image.LANCZOS)
+            self._logo_image = ImageTk.PhotoImage(img)
+            self.logo_label.configure(image=self._logo_image)
+        except Exception:
+            pass
 
     def _setup_styles(self):
         style = ttk.Style()
@@ -380,20 +1388,9 @@ class DOInvoiceApp:
         header_frame.pack(fill=tk.X)
         tk.Frame(main_frame, bg=BORDER_COLOR, height=1).pack(fill=tk.X)
 
-        # Logo (Left)
-        logo_path = resource_path("logo.png")
-        if HAS_PIL and os.path.isfile(logo_path):
-            try:
-                img = Image.open(logo_path)
-                h = 40
-                w = int(img.width * h / img.height)
-                img = img.resize((w, h), Image.LANCZOS)
-                self._logo_image = ImageTk.PhotoImage(img)
-                tk.Label(header_frame, image=self._logo_image, bg=CARD_BG).pack(side=tk.LEFT)
-            except Exception:
-                tk.Label(header_frame, text="NAGARKOT", font=("Segoe UI", 12, "bold"), fg=ACCENT, bg=CARD_BG).pack(side=tk.LEFT)
-        else:
-            tk.Label(header_frame, text="NAGARKOT", font=("Segoe UI", 12, "bold"), fg=ACCENT, bg=CARD_BG).pack(side=tk.LEFT)
+        # Logo (Left) - text until _load_logo swaps in the image
+        self.logo_label = tk.Label(header_frame, text="NAGARKOT", font=("Segoe UI", 12, "bold"), fg=ACCENT, bg=CARD_BG)
+        self.logo_label.pack(side=tk.LEFT)
 
         # Centered Title
         tk.Label(
@@ -437,11 +1434,35 @@ class DOInvoiceApp:
             action_frame, text="\u25B6  Process & Generate CSV",
             command=self.process_files, style="Accent.TButton"
         )
-        self.process_button.pack(side=tk.LEFT, padx=(0, 20))
+        self.process_button.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.cancel_button = ttk.Button(action_frame, text="Cancel", command=self.cancel_processing, style="Modern.TButton")
+        self.cancel_button.pack(side=tk.LEFT, padx=(0, 20))
+        self.cancel_button.state(['disabled'])
 
         self.status_label = tk.Label(action_frame, text="Ready", fg=TEXT_SECONDARY, bg=BG_COLOR, font=("Segoe UI", 9))
         self.status_label.pack(side=tk.LEFT)
 
+        self.workers_var = tk.IntVar(value=DEFAULT_WORKERS)
+        ttk.Spinbox(action_frame, from_=1, to=max(DEFAULT_WORKERS, 32), width=4, textvariable=self.workers_var).pack(side=tk.RIGHT)
+        tk.Label(action_frame, text="Worker processes:", fg=TEXT_SECONDARY, bg=BG_COLOR, font=("Segoe UI", 9)).pack(side=tk.RIGHT, padx=(0, 6))
+
+        self.append_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            action_frame, text="Append to today's CSV (skip exported invoices)", variable=self.append_var,
+            fg=TEXT_SECONDARY, bg=BG_COLOR, activebackground=BG_COLOR, font=("Segoe UI", 9),
+        ).pack(side=tk.RIGHT, padx=(0, 20))
+
+        # --- Progress ---
+        progress_frame = tk.Frame(body, bg=BG_COLOR)
+        progress_frame.pack(fill=tk.X, pady=(0, 20))
+
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 15))
+
+        self.progress_label = tk.Label(progress_frame, text="", fg=TEXT_SECONDARY, bg=BG_COLOR, font=("Segoe UI", 9))
+        self.progress_label.pack(side=tk.LEFT)
+
         # --- Log Card ---
         log_card = ttk.LabelFrame(body, text="  Processing Log  ", style="Card.TLabelframe", padding=15)
         log_card.pack(fill=tk.BOTH, expand=True)
@@ -469,11 +1490,40 @@ class DOInvoiceApp:
         ttk.Button(footer_frame, text="Exit", command=self.root.destroy, style="Modern.TButton").pack(side=tk.RIGHT)
 
     def log(self, message):
+        # Safe from any thread; the text is inserted by _drain_events
+        self.events.put(("text", f"{datetime.now().strftime('%H:%M:%S')}: {message}"))
+
+    def _drain_events(self):
+        lines = []
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == "text":
+                    lines.append(event[1])
+                    continue
+                # Flush pending log lines before handling a state change
+                self._append_log(lines)
+                lines = []
+                if event[0] == "progress":
+                    self._show_progress(*event[1:])
+                elif event[0] == "done":
+                    self._finish_processing(*event[1:])
+        except queue.Empty:
+            pass
+        self._append_log(lines)
+        self.root.after(100, self._drain_events)
+
+    def _append_log(self, lines):
+        if not lines:
+            return
         self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')}: {message}\n")
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
         self.log_text.config(state='disabled')
         self.log_text.see(tk.END)
-        self.root.update()
+
+    def _show_progress(self, done, total, elapsed):
+        self.progress_bar.config(maximum=max(total, 1), value=done)
+        self.progress_label.config(text=format_progress(done, total, elapsed))
 
     def select_pdf(self):
         pdf_paths = filedialog.askopenfilenames(filetypes=[("PDF files", "*.pdf")])
@@ -498,33 +1548,18 @@ class DOInvoiceApp:
 
     def load_job_register(self):
         if not self.job_register_path:
-            self.job_register = []
+            self.job_register = BEIndex([])
             return
-        try:
-            if self.job_register_path.endswith('.csv'):
-                df = pd.read_csv(self.job_register_path, dtype=str)
-            else:
-                df = pd.read_excel(self.job_register_path, dtype=str)
-            df.columns = [c.strip().lower() for c in df.columns]
-            be_col = 'be no'
-            job_col = 'job no'
-            self.job_register = []
-            for _, row in df.iterrows():
-                self.job_register.append({
-                    'be_no': str(row.get(be_col, '')).strip(),
-                    'job_no': str(row.get(job_col, '')).strip(),
-                })
-            self.log(f"Loaded {len(self.job_register)} job register entries.")
-        except Exception as e:
-            self.log(f"Failed to load job register: {e}")
-            self.job_register = []
+        self.job_register = load_job_register(self.job_register_path, self.log)
 
     def match_job_no_by_be(self, be_no):
-        be_no = str(be_no).strip()
-        for entry in self.job_register:
-            if entry.get('be_no', '') == be_no:
-                return entry.get('job_no', 'No match found')
-        return 'No match found'
+        return match_job_no_by_be(self.job_register, be_no)
+
+    def get_worker_count(self):
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return DEFAULT_WORKERS
 
     def process_files(self):
         self.log_text.config(state='normal')
@@ -541,25 +1576,20 @@ class DOInvoiceApp:
             self.log("No job register selected or loaded")
             return
 
-        self.status_label.config(text="Processing...", fg=ACCENT)
-        self.process_button.state(['disabled'])
-        self.log("Starting processing")
-        self.root.update()
-
         # Output directory
-        if getattr(sys, 'frozen', False):
-            base_dir = os.path.dirname(sys.executable)
-        else:
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-        output_dir = os.path.join(base_dir, "HASTI_Output")
+        output_dir = os.path.join(app_base_dir(), "HASTI_Output")
         os.makedirs(output_dir, exist_ok=True)
         logger.info(f"Output directory: {output_dir}")
 
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
-        output_csv = os.path.join(output_dir, f"Hasti_{timestamp}.csv")
+        append = self.append_var.get()
+        if append:
+            output_csv = daily_output_path(output_dir)
+        else:
+            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+            output_csv = os.path.join(output_dir, f"Hasti_{timestamp}.csv")
         logger.info(f"Output CSV: {output_csv}")
 
-        if os.path.exists(output_csv):
+        if os.path.exists(output_csv) and not append:
             response = messagebox.askyesno(
                 "File Exists",
                 f"CSV file '{os.path.basename(output_csv)}' already exists. Overwrite?",
@@ -568,65 +1598,224 @@ class DOInvoiceApp:
             if not response:
                 self.log("Cancelled overwrite.")
                 self.status_label.config(text="Cancelled", fg=TEXT_SECONDARY)
-                self.process_button.state(['!disabled'])
                 return
 
-        all_details = []
-        for pdf_path in self.pdf_paths:
-            self.log(f"Processing {os.path.basename(pdf_path)}")
-            logger.info(f"Processing {pdf_path}")
-            try:
-                text, tables_data = extract_text_from_pdf(pdf_path, self.log)
-                if not text:
-                    self.log(f"Failed to extract text from {os.path.basename(pdf_path)}")
-                    logger.error(f"Text extraction failed for {pdf_path}")
-                    continue
-                details_list = extract_invoice_details_with_regex(text, tables_data, self.log)
-                if not details_list:
-                    self.log(f"No valid data extracted from {os.path.basename(pdf_path)}")
-                    logger.warning(f"No valid data extracted from {pdf_path}")
-                    continue
-                for details in details_list:
-                    be_no = details.get("BOE No", "")
-                    mapped_job_no = self.match_job_no_by_be(be_no)
-                    details["Ref No"] = mapped_job_no
-                    all_details.append(details)
-                self.log(f"Processed {os.path.basename(pdf_path)}: {len(details_list)} records extracted")
-                logger.info(f"Processed {pdf_path}: {len(details_list)} records extracted")
-            except Exception as e:
-                self.log(f"Failed to process {os.path.basename(pdf_path)}: {str(e)}")
-                logger.error(f"Processing failed for {pdf_path}: {e}")
-                continue
+        self.status_label.config(text="Processing...", fg=ACCENT)
+        self.process_button.state(['disabled'])
+        self.cancel_button.state(['!disabled'])
+        self.log("Starting processing")
+        self._show_progress(0, len(self.pdf_paths), 0)
 
-        if not all_details:
-            self.status_label.config(text="No valid data extracted", fg=ERROR_RED)
-            self.log("No valid data extracted from PDFs")
-            messagebox.showerror("Error", "No valid data extracted from PDFs")
-            self.process_button.state(['!disabled'])
-            return
+        self.cancel_event.clear()
+        self.worker = threading.Thread(
+            target=self._process_batch,
+            args=(list(self.pdf_paths), output_csv, self.get_worker_count(), append),
+            daemon=True,
+        )
+        self.worker.start()
 
-        if create_csv(all_details, output_csv, self.log):
-            self.status_label.config(text="Completed Successfully", fg=SUCCESS_COLOR)
-            self.log(f"CSV generated with {len(all_details)} records: {os.path.basename(output_csv)}")
-            messagebox.showinfo("Success", f"CSV saved to {output_csv} with {len(all_details)} records")
-        else:
-            self.status_label.config(text="Failed", fg=ERROR_RED)
-            self.log("Failed to generate CSV")
-            messagebox.showerror("Error", "Failed to generate CSV")
+    def cancel_processing(self):
+        if self.worker and self.worker.is_alive():
+            self.cancel_event.set()
+            self.cancel_button.state(['disabled'])
+            self.status_label.config(text="Cancelling...", fg=TEXT_SECONDARY)
+            self.log("Cancel requested; stopping after the current file")
 
+    def _process_batch(self, pdf_paths, output_csv, workers, append=False):
+        # Runs on the worker thread: no Tk calls here, only self.log / self.events
+        def post_progress(done, total, elapsed):
+            self.events.put(("progress", done, total, elapsed))
+
+        export_index = None
+        try:
+            metrics = RunMetrics("hasti")
+            if append:
+                export_index = ExportIndex(export_index_path(output_csv))
+            with ExtractionCache(default_cache_path(), PARSER_VERSION) as cache:
+                result = process_invoice_batch(
+                    pdf_paths, output_csv, self.job_register, self.log, workers, cache,
+                    progress_callback=post_progress, cancel_event=self.cancel_event, metrics=metrics,
+                    export_index=export_index, journal=run_journal_for(pdf_paths),
+                )
+            save_metrics(metrics, metrics_path_for(output_csv), None, self.log)
+            if result.outcome == "cancelled":
+                self.events.put(("done", "cancelled", "Cancelled", None))
+            elif result.outcome == "no_data":
+                self.events.put(("done", "error", "No valid data extracted", "No valid data extracted from PDFs"))
+            elif result.outcome == "success" and append:
+                self.events.put(("done", "success", "Completed Successfully",
+                                 f"{result.records} records appended to {output_csv}; "
+                                 f"{result.already_exported} already exported records skipped"))
+            elif result.outcome == "success":
+                self.events.put(("done", "success", "Completed Successfully", f"CSV saved to {output_csv} with {result.records} records"))
+            else:
+                self.events.put(("done", "error", "Failed", "Failed to generate CSV"))
+        except Exception as e:
+            self.log(f"Processing failed: {str(e)}")
+            logger.error(f"Processing failed: {e}")
+            self.events.put(("done", "error", "Failed", f"Processing failed: {e}"))
+        finally:
+            if export_index is not None:
+                export_index.close()
+
+    def _finish_processing(self, outcome, status, message):
         self.process_button.state(['!disabled'])
+        self.cancel_button.state(['disabled'])
+        if outcome == "success":
+            self.status_label.config(text=status, fg=SUCCESS_COLOR)
+            messagebox.showinfo("Success", message)
+        elif outcome == "cancelled":
+            self.status_label.config(text=status, fg=TEXT_SECONDARY)
+        else:
+            self.status_label.config(text=status, fg=ERROR_RED)
+            messagebox.showerror("Error", message)
+
+# Command line
+def cli_main(argv=None):
+    """Convert a batch without the GUI; returns a batch_cli EXIT_* code."""
+    parser = argparse.ArgumentParser(
+        prog="HASTI_Invoice_to_CSV",
+        description="Convert HASTI DO invoice PDFs to a Logisys upload CSV without the GUI.",
+    )
+    parser.add_argument("inputs", nargs="+", help="invoice PDFs, folders of PDFs or glob patterns (quote them); with --watch, the inbox folder")
+    parser.add_argument("-j", "--job-register", required=True, help="job register with BE No and Job No columns (.csv, .xlsx, .xls)")
+    parser.add_argument("-o", "--output", help="output CSV (default: HASTI_Output/Hasti_<timestamp>.csv); with --watch, the output folder (default: HASTI_Output)")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help=f"worker processes for PDF extraction (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--overwrite", action="store_true", help="replace the output CSV if it already exists")
+    parser.add_argument("--append", action="store_true", help="append to the output CSV (default: HASTI_Output/Hasti_<date>.csv), skipping invoices already exported (Vendor Inv No + BOE No, recorded in exported_keys.sqlite beside it)")
+    parser.add_argument("--no-cache", action="store_true", help="always re-parse PDFs instead of using the extraction cache")
+    parser.add_argument("--format", dest="formats", action="append", default=[], choices=OUTPUT_FORMATS,
+                        help="also write the rows in this format beside the CSV; may be repeated (parquet needs pyarrow, csv.zst needs zstandard)")
+    parser.add_argument("--no-resume", action="store_true", help="process every PDF, ignoring the journal of an interrupted run over the same PDFs")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary and errors")
+    parser.add_argument("-v", "--verbose", action="store_true", help=f"also log the raw extracted text and DEBUG field detail (same as {log_pipeline.LOG_LEVEL_ENV}=DEBUG)")
+    watch = parser.add_argument_group("watch mode")
+    watch.add_argument("--watch", action="store_true", help="keep running and convert PDFs as they arrive in the inbox folder, appending to HASTI_Output/Hasti_<date>.csv")
+    watch.add_argument("--interval", type=float, default=2.0, help="seconds between inbox scans (default: 2)")
+    watch.add_argument("--settle", type=float, default=WATCH_SETTLE_SECONDS, help=f"seconds a PDF must stay unchanged before it is read (default: {WATCH_SETTLE_SECONDS:g})")
+    watch.add_argument("--manifest", help="record of converted PDFs (default: watch_manifest.jsonl in the output folder)")
+    watch.add_argument("--once", action="store_true", help="convert the PDFs already in the inbox, then exit")
+    batch_cli.add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    log = batch_cli.console_logger(args.quiet)
+    if args.verbose:
+        log_pipeline.set_level(logging.DEBUG)
+
+    if args.watch or args.once:
+        return _watch_main(args, log)
+
+    pdf_paths = batch_cli.expand_input_paths(args.inputs, (".pdf",))
+    missing = [path for path in pdf_paths if not os.path.isfile(path)]
+    if missing:
+        print(f"Error: input not found: {', '.join(missing)}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    if not pdf_paths:
+        print("Error: no PDFs matched the inputs", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    if not os.path.isfile(args.job_register):
+        print(f"Error: job register not found: {args.job_register}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    job_register = load_job_register(args.job_register, log)
+    if not job_register:
+        print(f"Error: no entries loaded from job register {args.job_register}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+
+    output_csv = args.output
+    if not output_csv:
+        output_dir = os.path.join(app_base_dir(), "HASTI_Output")
+        if args.append:
+            output_csv = daily_output_path(output_dir)
+        else:
+            output_csv = os.path.join(output_dir, f"Hasti_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.csv")
+    if os.path.exists(output_csv) and not (args.overwrite or args.append):
+        print(f"Error: {output_csv} already exists (use --overwrite to replace it)", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    format_error = check_formats(args.formats, args.append)
+    if format_error:
+        print(f"Error: {format_error}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    os.makedirs(os.path.dirname(os.path.abspath(output_csv)), exist_ok=True)
+
+    logger.info(f"Command-line run: {len(pdf_paths)} PDFs -> {output_csv}")
+    cache = None if args.no_cache else ExtractionCache(default_cache_path(), PARSER_VERSION)
+    export_index = ExportIndex(export_index_path(output_csv)) if args.append else None
+    try:
+        metrics = RunMetrics("hasti")
+        result = process_invoice_batch(pdf_paths, output_csv, job_register, log, max(1, args.workers), cache,
+                                       metrics=metrics, export_index=export_index,
+                                       journal=run_journal_for(pdf_paths, resume=not args.no_resume),
+                                       output_formats=args.formats)
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return batch_cli.EXIT_INTERRUPTED
+    except Exception as e:
+        logger.error(f"Command-line run failed: {e}")
+        print(f"Error: processing failed: {e}", file=sys.stderr)
+        return batch_cli.EXIT_FAILED
+    finally:
+        if cache is not None:
+            cache.close()
+        if export_index is not None:
+            export_index.close()
+
+    save_metrics(metrics, args.metrics_json or metrics_path_for(output_csv), args.prometheus, log)
+    skipped = f", {result.already_exported} already exported" if args.append else ""
+    print(f"{result.files_done} PDFs processed, {result.records} records{skipped}, "
+          f"{result.files_without_records} PDFs without records -> {output_csv if result.outcome == 'success' else 'no CSV written'}")
+    if result.outcome == "no_data":
+        return batch_cli.EXIT_NO_DATA
+    if result.outcome != "success":
+        return batch_cli.EXIT_FAILED
+    return batch_cli.EXIT_PARTIAL if result.files_without_records else batch_cli.EXIT_OK
+
+def _watch_main(args, log):
+    if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]):
+        print("Error: --watch takes exactly one inbox folder", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    if not os.path.isfile(args.job_register):
+        print(f"Error: job register not found: {args.job_register}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    format_error = check_formats(args.formats, append=True)
+    if format_error:
+        print(f"Error: {format_error}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    output_dir = args.output or os.path.join(app_base_dir(), "HASTI_Output")
+    cache = None if args.no_cache else ExtractionCache(default_cache_path(), PARSER_VERSION)
+    try:
+        watch_inbox(args.inputs[0], args.job_register, output_dir, log, args.manifest, max(1, args.workers), cache,
+                    interval=args.interval, settle_seconds=args.settle, once=args.once,
+                    metrics_json=args.metrics_json or os.path.join(output_dir, "watch_metrics.json"),
+                    prometheus_path=args.prometheus, output_formats=args.formats)
+    except KeyboardInterrupt:
+        # Ctrl+C is how a watch is normally stopped
+        print("Stopped watching", file=sys.stderr)
+    except Exception as e:
+        logger.error(f"Watch failed: {e}")
+        print(f"Error: watch failed: {e}", file=sys.stderr)
+        return batch_cli.EXIT_FAILED
+    finally:
+        if cache is not None:
+            cache.close()
+    return batch_cli.EXIT_OK
 
 # Main
 def main():
+    # Needed for worker processes in the frozen (PyInstaller) executable
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(cli_main(sys.argv[1:]))
     try:
-        logger.info("Starting HASTI DO Invoice Processor")
+        load_gui()
         root = tk.Tk()
         app = DOInvoiceApp(root)
+        root.after_idle(logger.info, "Starting HASTI DO Invoice Processor")
+        schedule_startup_probe(root)
         root.mainloop()
         logger.info("Application closed")
     except Exception as e:
         logger.error(f"Application error: {e}")
-        messagebox.showerror("Error", f"Application error: {e}")
+        if messagebox is not None:
+            messagebox.showerror("Error", f"Application error: {e}")
 
 if __name__ == "__main__":
     main()
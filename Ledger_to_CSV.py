@@ -1,25 +1,37 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
-import pandas as pd
+import argparse
 import os
 import sys
 from datetime import datetime
 import logging
 import re
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from run_metrics import (RunMetrics, StageTimer, peak_rss_bytes, format_bytes, format_progress,
+                         metrics_path_for, schedule_startup_probe)
+from register_snapshot import load_snapshot, save_snapshot
+from export_index import ExportIndex
+from date_parser import DateParser
+from output_writers import OUTPUT_FORMATS, ExtraOutputs, check_formats
+import batch_cli
+import log_pipeline
 
-try:
-    from PIL import Image, ImageTk
-    HAS_PIL = True
-except ImportError:
-    HAS_PIL = False
+# Heavy dependencies are imported where they are first used: Tk by
+# load_gui(), so the command-line mode runs on hosts without it (or without a
+# display); PIL once the window is up; pandas and pdfplumber by the functions
+# that read files. Startup is measured by benchmarks/startup_benchmark.py.
+tk = filedialog = messagebox = scrolledtext = ttk = None
 
-# Setup logging to file
-logging.basicConfig(
-    filename='ledger_to_purchase.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger()
+def load_gui():
+    global tk, filedialog, messagebox, scrolledtext, ttk
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, scrolledtext, ttk
+
+# Setup logging to a rotating file, written by a background thread; the file
+# is opened by the first record, not at import
+logger = log_pipeline.setup_logging('ledger_to_purchase.log')
 
 # --- Color Palette --- 
 BG_COLOR = "#F4F6F8"  # Nagarkot Light Background
@@ -35,24 +47,25 @@ ERROR_RED = "#D8232A"     # Nagarkot Red for errors
 LOG_BG = "#FAFBFC"
 LOG_FG = "#1E1E1E"
 
-# Custom handler to display logs in GUI
+# Custom handler to display logs in GUI; it runs on the log_pipeline listener
+# thread and queues the text, which the UI inserts on its own thread
 class TextHandler(logging.Handler):
-    def __init__(self, text_widget):
+    def __init__(self, event_queue):
         super().__init__()
-        self.text_widget = text_widget
+        self.event_queue = event_queue
 
     def emit(self, record):
         try:
-            if self.text_widget.winfo_exists():
-                msg = self.format(record)
-                self.text_widget.config(state='normal')
-                self.text_widget.insert(tk.END, msg + '\n')
-                # Auto-scroll, but respect tags if implemented later
-                self.text_widget.config(state='disabled')
-                self.text_widget.see(tk.END)
+            self.event_queue.put(("text", self.format(record)))
         except Exception:
             pass
 
+def app_base_dir():
+    """Folder of the executable when frozen, else of this script."""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
     try:
@@ -66,180 +79,657 @@ def resource_path(relative_path):
 # Global variable to store Job Register path
 JOB_REGISTER_PATH = None
 
+# Bump when JobRegisterIndex's parsing changes so saved snapshots are rebuilt
+JOB_REGISTER_SNAPSHOT_VERSION = "1"
+
+# Job Register loaded once and indexed by cleaned BOE number; the parsed index
+# is saved as a snapshot next to the register and reused while it is current
+class JobRegisterIndex:
+    BOE_COLUMNS = ["BOE No", "BE No.", "BE No", "BOE No.", "BOE Number", "Bill of Entry No"]
+    JOB_COLUMNS = ["Job No.", "Job No", "Job Number", "Ref No", "Reference No"]
+
+    def __init__(self):
+        self.path = None
+        self.signature = None
+        self.jobs = {}
+        self.loaded = False
+        self._frame = None
+
+    # Cleaned as the register's own BOE column is, so 9793713.0 finds 9793713
+    @staticmethod
+    def clean_key(value):
+        return re.sub(r'\.0$', '', str(value)).strip().lower()
+
+    @staticmethod
+    def clean_keys(values):
+        return values.astype(str).str.replace(r'\.0$', '', regex=True).str.strip().str.lower()
+
+    def refresh(self, path, log_callback):
+        """Load the register if the path changed or the file's mtime/size changed."""
+        if path is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            log_callback(f"Error reading Job Register file: {str(e)}")
+            logger.error(f"Error reading Job Register file: {e}")
+            self.path, self.signature, self.jobs, self.loaded = path, None, {}, False
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if path == self.path and signature == self.signature:
+            return self.loaded
+        self.path, self.signature = path, signature
+        self.loaded = self._load(path, log_callback)
+        return self.loaded
+
+    def _load(self, path, log_callback):
+        self.jobs = {}
+        self._frame = None
+        jobs = load_snapshot(path, "ledger", JOB_REGISTER_SNAPSHOT_VERSION)
+        if jobs is not None:
+            self.jobs = jobs
+            log_callback(f"Indexed {len(self.jobs)} BOE numbers from Job Register (snapshot)")
+            logger.info(f"Indexed {len(self.jobs)} BOE numbers from Job Register snapshot: {path}")
+            return True
+        if not self._read(path, log_callback):
+            return False
+        if not save_snapshot(path, "ledger", JOB_REGISTER_SNAPSHOT_VERSION, self.jobs):
+            logger.warning(f"Could not save Job Register snapshot for {path}")
+        return True
+
+    def _read(self, path, log_callback):
+        import pandas as pd
+        try:
+            # Read Job Register based on file extension
+            if path.endswith('.csv'):
+                df = pd.read_csv(path)
+            elif path.endswith('.xlsx'):
+                df = pd.read_excel(path, engine='openpyxl')
+            else:
+                log_callback(f"Unsupported Job Register file format: {path}")
+                logger.error(f"Unsupported Job Register file format: {path}")
+                return False
+
+            # Try multiple possible BOE / Job No column names
+            boe_column = next((col for col in self.BOE_COLUMNS if col in df.columns), None)
+            if boe_column is None:
+                log_callback(f"BOE column not found in Job Register file. Available columns: {list(df.columns)}")
+                logger.error(f"BOE column not found in Job Register file. Available columns: {list(df.columns)}")
+                return False
+            job_column = next((col for col in self.JOB_COLUMNS if col in df.columns), None)
+            if job_column is None:
+                log_callback(f"Job No column not found in Job Register file. Available columns: {list(df.columns)}")
+                logger.error(f"Job No column not found in Job Register file. Available columns: {list(df.columns)}")
+                return False
+
+            # Clean BOE numbers for matching; the first row for a BOE wins
+            boe_keys = self.clean_keys(df[boe_column])
+            # tolist() gives Python values (not numpy scalars), so the index can be saved as JSON
+            for key, job_no in zip(boe_keys, df[job_column].tolist()):
+                self.jobs.setdefault(key, job_no)
+            log_callback(f"Indexed {len(self.jobs)} BOE numbers from Job Register")
+            logger.info(f"Indexed {len(self.jobs)} BOE numbers from Job Register: {path}")
+            return True
+        except Exception as e:
+            log_callback(f"Error reading Job Register file: {str(e)}")
+            logger.error(f"Error reading Job Register file: {e}")
+            return False
+
+    def lookup(self, boe_number):
+        return self.jobs.get(self.clean_key(boe_number))
+
+    def frame(self):
+        """Register as a boe_key / Job No frame for merging against a whole ledger."""
+        if self._frame is None:
+            import pandas as pd
+            self._frame = pd.DataFrame({
+                'boe_key': pd.Series(list(self.jobs.keys()), dtype=object),
+                'Job No': pd.Series(list(self.jobs.values()), dtype=object),
+            })
+        return self._frame
+
+JOB_REGISTER = JobRegisterIndex()
+
 # Function to get Job Number from Job Register CSV or Excel
 def get_job_number(boe_number, log_callback):
-    global JOB_REGISTER_PATH
     if JOB_REGISTER_PATH is None:
         log_callback("Job Register file not set.")
         return "NA"
+    if not JOB_REGISTER.refresh(JOB_REGISTER_PATH, log_callback):
+        return "NA"
+    job_no = JOB_REGISTER.lookup(boe_number)
+    if job_no is not None:
+        log_callback(f"Found Job No: {job_no} for BOE No.: {boe_number}")
+        return job_no
+    log_callback(f"No Job No found for BOE No.: {boe_number}")
+    return "NA"
+
+# Txn Date text as Excel exports it; the column is formatted with
+# TXN_DATES.format_many() and anything these cannot read falls back to
+# pd.to_datetime once per distinct value
+TXN_DATE_FORMATS = [
+    "%Y-%m-%d",           # 2025-06-13
+    "%Y-%m-%d %H:%M:%S",  # 2025-06-13 00:00:00
+]
+TXN_DATES = DateParser(TXN_DATE_FORMATS, not_found=None)
+
+# pd.read_excel turns a numeric Receipt No. / BOE No. column with blanks
+# into float64 (9793713.0), while the streaming reader keeps openpyxl's
+# ints. Whole floats are turned back into ints so every engine prints and
+# looks up the same values.
+LEDGER_ID_COLUMNS = ("Receipt No.", "BOE No.")
+
+def normalize_ledger_ids(ledger_data):
+    import pandas as pd
+    for column in LEDGER_ID_COLUMNS:
+        values = ledger_data.get(column)
+        if values is None or not pd.api.types.is_float_dtype(values):
+            continue
+        whole = values.notna() & (values % 1 == 0)
+        ids = values.astype(object)
+        ids[whole] = [int(value) for value in values[whole]]
+        ledger_data = ledger_data.assign(**{column: ids})
+    return ledger_data
+
+# Row engine: one dict per ledger row
+def build_purchase_rows(ledger_data, today, log_callback):
+    import pandas as pd
+    ledger_data = normalize_ledger_ids(ledger_data)
+    data_list = []
+    for idx, row in ledger_data.iterrows():
+        # Skip rows with empty or missing Receipt No.
+        receipt_no = row.get('Receipt No.')
+        if pd.isna(receipt_no) or str(receipt_no).strip() == '':
+            log_callback(f"Skipping row {idx} due to missing Receipt No.: {receipt_no}")
+            logger.warning(f"Skipping row {idx} due to missing Receipt No.: {receipt_no}")
+            continue
+        
+        # Skip rows with empty or missing BOE No.
+        boe_no = row.get('BOE No.')
+        if pd.isna(boe_no) or str(boe_no).strip() == '':
+            log_callback(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing BOE No.: {boe_no}")
+            logger.warning(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing BOE No.: {boe_no}")
+            continue
+
+        # Handle Txn Date
+        try:
+            txn_date = pd.to_datetime(row['Txn Date'])
+            if pd.isna(txn_date):  # Check for NaT
+                log_callback(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing or invalid Txn Date: {row['Txn Date']}")
+                logger.warning(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing or invalid Txn Date: {row['Txn Date']}")
+                continue
+            vendor_inv_date = txn_date.strftime("%d-%b-%Y")
+        except Exception as e:
+            log_callback(f"Skipping row {idx} with Receipt No.: {receipt_no} due to invalid Txn Date: {str(e)}")
+            logger.warning(f"Skipping row {idx} with Receipt No.: {receipt_no} due to invalid Txn Date: {e}")
+            continue
+
+        # Custom logic for ABBOTT HEALTHCARE PRIVATE LIMITED
+        consignee_name = row.get('Consignee Name', '').strip()
+        # Match any Consignee Name that starts with 'ABBOTT HEALTHCARE' (case-insensitive)
+        if consignee_name.upper().startswith("ABBOTT HEALTHCARE"):
+            charge_or_gl_name = "GATE PASS CHARGES - REIM"
+            charge_or_gl_amount = "336"
+            taxcode1 = ""
+            taxcode1_amt = ""
+            taxcode2 = ""
+            taxcode2_amt = ""
+            amount = "336"
+            avail_tax_credit = "No"
+        else:
+            charge_or_gl_name = "GATE PASS CHARGES CCL"
+            charge_or_gl_amount = "285"
+            taxcode1 = "Central GST"
+            taxcode1_amt = "25.65"
+            taxcode2 = "State GST"
+            taxcode2_amt = "25.65"
+            avail_tax_credit = "100"
+            amount = "285"
+
+        job_no = get_job_number(boe_no, log_callback)
+        if job_no and job_no != "NA":
+            narration = f"Being Entry posted for Gatepass / Kale Logistics / {job_no}"
+        else:
+            narration = "Being Entry posted for Gatepass / Kale Logistics"
+        data = {
+            "Entry Date": today,
+            "Posting Date": today,
+            "Organization": "KALE LOGISTICS SOLUTIONS PVT LTD",
+            "Organization Branch": "THANE",
+            "Vendor Inv No": receipt_no,
+            "Vendor Inv Date": vendor_inv_date,
+            "Currency": "INR",
+            "ExchRate": "1",
+            "Narration": narration,
+            "Due Date": "",
+            "Charge or GL": "Charge",
+            "Charge or GL Name": charge_or_gl_name,
+            "Charge or GL Amount": charge_or_gl_amount,
+            "DR or CR": "Dr",
+            "Cost Center": "",
+            "Branch": "HO",
+            " Charge Narration": "GATE PASS CHARGES",
+            "TaxGroup": "GSTIN",
+            "Tax Type": "Taxable",
+            "SAC or HSN": "996712",
+            "Taxcode1": taxcode1,
+            "Taxcode1 Amt": taxcode1_amt,
+            "Taxcode2": taxcode2,
+            "Taxcode2 Amt": taxcode2_amt,
+            "Taxcode3": "",
+            "Taxcode3 Amt": "",
+            "Taxcode4": "",
+            "Taxcode4 Amt": "",
+            "Avail Tax Credit": avail_tax_credit,
+            "LOB": "CCL IMP",
+            "Ref Type": "",
+            "Ref No": job_no,
+            "Amount": amount,
+            "Start Date": "",
+            "End Date": "",
+            "WH Tax Code": "",
+            "WH Tax Percentage": "",
+            "WH Tax Taxable": "",
+            "WH Tax Amount": "",
+            "Round Off": "Yes",
+            "CC Code": ""
+        }
+        data_list.append(data)
+    return data_list
+
+def format_txn_dates(txn_dates):
+    """Parse a Txn Date column in bulk.
+
+    Returns the dates formatted as DD-MMM-YYYY and, for rows that could not be
+    parsed, the skip reason used by the row engine.
+    """
+    import pandas as pd
+    formatted = pd.Series(None, index=txn_dates.index, dtype=object)
+    errors = pd.Series(None, index=txn_dates.index, dtype=object)
     try:
-        # Read Job Register based on file extension
-        if JOB_REGISTER_PATH.endswith('.csv'):
-            df = pd.read_csv(JOB_REGISTER_PATH)
-        elif JOB_REGISTER_PATH.endswith('.xlsx'):
-            df = pd.read_excel(JOB_REGISTER_PATH, engine='openpyxl')
+        present = txn_dates.notna()
+        if pd.api.types.is_datetime64_any_dtype(txn_dates):
+            formatted[present] = txn_dates[present].dt.strftime("%d-%b-%Y")
         else:
-            log_callback(f"Unsupported Job Register file format: {JOB_REGISTER_PATH}")
-            logger.error(f"Unsupported Job Register file format: {JOB_REGISTER_PATH}")
-            return "NA"
-        
-        # Try multiple possible BOE column names
-        boe_column = None
-        possible_boe_columns = ["BOE No", "BE No.", "BE No", "BOE No.", "BOE Number", "Bill of Entry No"]
-        for col in possible_boe_columns:
-            if col in df.columns:
-                boe_column = col
-                break
-        if boe_column is None:
-            log_callback(f"BOE column not found in Job Register file. Available columns: {list(df.columns)}")
-            logger.error(f"BOE column not found in Job Register file. Available columns: {list(df.columns)}")
-            return "NA"
-        
-        # Try multiple possible Job No column names
-        job_column = None
-        possible_job_columns = ["Job No.", "Job No", "Job Number", "Ref No", "Reference No"]
-        for col in possible_job_columns:
-            if col in df.columns:
-                job_column = col
-                break
-        if job_column is None:
-            log_callback(f"Job No column not found in Job Register file. Available columns: {list(df.columns)}")
-            logger.error(f"Job No column not found in Job Register file. Available columns: {list(df.columns)}")
-            return "NA"
-        
-        # Clean BOE numbers for matching
-        df[boe_column] = df[boe_column].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
-        boe_number_clean = str(boe_number).strip()
-        match = df[df[boe_column].str.lower() == boe_number_clean.lower()][job_column]
-        if not match.empty:
-            job_no = match.iloc[0]
-            log_callback(f"Found Job No: {job_no} for BOE No.: {boe_number}")
-            return job_no
+            # Cell values as read: datetimes, or text in one of TXN_DATE_FORMATS
+            formatted[present] = TXN_DATES.format_many(txn_dates[present].tolist(), "%d-%b-%Y")
+        ok = formatted.notna()
+    except (ValueError, TypeError):
+        ok = pd.Series(False, index=txn_dates.index)
+
+    # Leftovers (other layouts, mixed timezones, blanks) go through the row engine's parser
+    cache = {}
+    for idx, value in txn_dates[~ok].items():
+        key = (type(value), value) if not pd.isna(value) else None
+        if key not in cache:
+            try:
+                txn_date = pd.to_datetime(value)
+                if pd.isna(txn_date):
+                    cache[key] = (None, f"missing or invalid Txn Date: {value}")
+                else:
+                    cache[key] = (txn_date.strftime("%d-%b-%Y"), None)
+            except Exception as e:
+                cache[key] = (None, f"invalid Txn Date: {str(e)}")
+        formatted[idx], errors[idx] = cache[key]
+    return formatted, errors
+
+def _blank_mask(column):
+    return column.isna() | (column.astype(str).str.strip() == '')
+
+# Check every row's Receipt No., BOE No. and Txn Date and log the rows skipped.
+# Returns (valid mask, receipt_nos, boe_nos, formatted Txn Dates)
+def _validate_ledger_rows(ledger_data, log_callback):
+    import pandas as pd
+    index = ledger_data.index
+    missing = pd.Series(None, index=index, dtype=object)
+    receipt_nos = ledger_data.get('Receipt No.', missing)
+    boe_nos = ledger_data.get('BOE No.', missing)
+
+    skip_reasons = pd.Series(None, index=index, dtype=object)
+    no_receipt = _blank_mask(receipt_nos)
+    no_boe = ~no_receipt & _blank_mask(boe_nos)
+    skip_reasons[no_receipt] = "missing Receipt No."
+    skip_reasons[no_boe] = "missing BOE No."
+
+    vendor_inv_dates = pd.Series(None, index=index, dtype=object)
+    pending = skip_reasons.isna()
+    if 'Txn Date' in ledger_data.columns:
+        formatted, date_errors = format_txn_dates(ledger_data.loc[pending, 'Txn Date'])
+        vendor_inv_dates[pending] = formatted
+        skip_reasons.update(date_errors.dropna())
+    else:
+        skip_reasons[pending] = "invalid Txn Date: 'Txn Date'"
+
+    # Log skipped rows in ledger order, with the same messages as the row engine
+    for idx, reason in skip_reasons.dropna().items():
+        receipt_no, boe_no = receipt_nos[idx], boe_nos[idx]
+        if reason == "missing Receipt No.":
+            message = f"Skipping row {idx} due to missing Receipt No.: {receipt_no}"
+        elif reason == "missing BOE No.":
+            message = f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing BOE No.: {boe_no}"
         else:
-            log_callback(f"No Job No found for BOE No.: {boe_number}")
-            return "NA"
-    except Exception as e:
-        log_callback(f"Error reading Job Register file: {str(e)}")
-        logger.error(f"Error reading Job Register file: {e}")
-        return "NA"
+            message = f"Skipping row {idx} with Receipt No.: {receipt_no} due to {reason}"
+        log_callback(message)
+        logger.warning(message)
+    return skip_reasons.isna(), receipt_nos, boe_nos, vendor_inv_dates
+
+# One merge of the BOE numbers against the indexed Job Register; "NA" where unmatched
+def _lookup_job_numbers(boe_nos, log_callback):
+    import numpy as np
+    import pandas as pd
+    if JOB_REGISTER_PATH is None:
+        log_callback("Job Register file not set.")
+        register = JobRegisterIndex().frame()
+    elif JOB_REGISTER.refresh(JOB_REGISTER_PATH, log_callback):
+        register = JOB_REGISTER.frame()
+    else:
+        register = JobRegisterIndex().frame()
+    boe_keys = JobRegisterIndex.clean_keys(boe_nos).to_frame('boe_key')
+    jobs = boe_keys.merge(register, on='boe_key', how='left', indicator=True)
+    matched = (jobs['_merge'] == 'both').to_numpy()
+    job_nos = pd.Series(np.where(matched, jobs['Job No'].to_numpy(), "NA"), index=boe_nos.index, dtype=object)
+    log_callback(f"Matched {int(matched.sum())} of {len(job_nos)} BOE numbers to Job Nos")
+    return job_nos
+
+# Columnar engine: same output as build_purchase_rows, computed a column at a time.
+# `timer` (a StageTimer), if given, gets the validation, job_lookup and
+# build_rows times.
+def build_purchase_frame(ledger_data, today, log_callback, timer=None):
+    import numpy as np
+    import pandas as pd
+    timer = timer if timer is not None else StageTimer()
+    with timer("validation"):
+        ledger_data = normalize_ledger_ids(ledger_data)
+        valid, receipt_nos, boe_nos, vendor_inv_dates = _validate_ledger_rows(ledger_data, log_callback)
+    if not valid.any():
+        return pd.DataFrame()
+    receipt_nos, boe_nos = receipt_nos[valid], boe_nos[valid]
+    index = ledger_data.index
+    with timer("job_lookup"):
+        job_nos = _lookup_job_numbers(boe_nos, log_callback)
+    build_started = time.perf_counter()
+
+    # Match any Consignee Name that starts with 'ABBOTT HEALTHCARE' (case-insensitive)
+    consignee = ledger_data.get('Consignee Name', pd.Series('', index=index))[valid]
+    abbott = consignee.fillna('').astype(str).str.strip().str.upper().str.startswith("ABBOTT HEALTHCARE").to_numpy()
+
+    def pick(abbott_value, other_value):
+        return np.where(abbott, abbott_value, other_value)
+
+    has_job = job_nos.astype(bool) & (job_nos != "NA")
+    narration = np.where(
+        has_job,
+        "Being Entry posted for Gatepass / Kale Logistics / " + job_nos.map(str),
+        "Being Entry posted for Gatepass / Kale Logistics",
+    )
+
+    frame = pd.DataFrame({
+        "Entry Date": today,
+        "Posting Date": today,
+        "Organization": "KALE LOGISTICS SOLUTIONS PVT LTD",
+        "Organization Branch": "THANE",
+        "Vendor Inv No": receipt_nos,
+        "Vendor Inv Date": vendor_inv_dates[valid],
+        "Currency": "INR",
+        "ExchRate": "1",
+        "Narration": narration,
+        "Due Date": "",
+        "Charge or GL": "Charge",
+        "Charge or GL Name": pick("GATE PASS CHARGES - REIM", "GATE PASS CHARGES CCL"),
+        "Charge or GL Amount": pick("336", "285"),
+        "DR or CR": "Dr",
+        "Cost Center": "",
+        "Branch": "HO",
+        " Charge Narration": "GATE PASS CHARGES",
+        "TaxGroup": "GSTIN",
+        "Tax Type": "Taxable",
+        "SAC or HSN": "996712",
+        "Taxcode1": pick("", "Central GST"),
+        "Taxcode1 Amt": pick("", "25.65"),
+        "Taxcode2": pick("", "State GST"),
+        "Taxcode2 Amt": pick("", "25.65"),
+        "Taxcode3": "",
+        "Taxcode3 Amt": "",
+        "Taxcode4": "",
+        "Taxcode4 Amt": "",
+        "Avail Tax Credit": pick("No", "100"),
+        "LOB": "CCL IMP",
+        "Ref Type": "",
+        "Ref No": job_nos,
+        "Amount": pick("336", "285"),
+        "Start Date": "",
+        "End Date": "",
+        "WH Tax Code": "",
+        "WH Tax Percentage": "",
+        "WH Tax Taxable": "",
+        "WH Tax Amount": "",
+        "Round Off": "Yes",
+        "CC Code": ""
+    }, index=receipt_nos.index)
+    timer.add("build_rows", time.perf_counter() - build_started)
+    return frame
 
 # Function to create CSV
-def create_csv(ledger_data, output_path, log_callback):
+def create_csv(ledger_data, output_path, log_callback, engine="columnar", timer=None):
     log_callback("Creating CSV file...")
+    timer = timer if timer is not None else StageTimer()
     try:
         today = datetime.now().strftime("%d-%b-%Y")  # e.g., 14-Jun-2025
-        data_list = []
-        for idx, row in ledger_data.iterrows():
-            # Skip rows with empty or missing Receipt No.
-            receipt_no = row.get('Receipt No.')
-            if pd.isna(receipt_no) or str(receipt_no).strip() == '':
-                log_callback(f"Skipping row {idx} due to missing Receipt No.: {receipt_no}")
-                logger.warning(f"Skipping row {idx} due to missing Receipt No.: {receipt_no}")
-                continue
-            
-            # Skip rows with empty or missing BOE No.
-            boe_no = row.get('BOE No.')
-            if pd.isna(boe_no) or str(boe_no).strip() == '':
-                log_callback(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing BOE No.: {boe_no}")
-                logger.warning(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing BOE No.: {boe_no}")
+        if engine == "columnar":
+            df = build_purchase_frame(ledger_data, today, log_callback, timer)
+        else:
+            import pandas as pd
+            with timer("build_rows"):
+                df = pd.DataFrame(build_purchase_rows(ledger_data, today, log_callback))
+        if df.empty:
+            log_callback("No valid rows to process for CSV creation.")
+            logger.warning("No valid rows to process for CSV creation.")
+            return False
+        with timer("csv_write"):
+            df.to_csv(output_path, index=False)
+        timer.count("records", len(df))
+        log_callback(f"CSV saved to {output_path} with {len(df)} records")
+        return True
+    except Exception as e:
+        log_callback(f"Failed to create CSV: {str(e)}")
+        logger.error(f"Failed to create CSV: {e}")
+        return False
+
+# Rows read from the ledger per streaming chunk
+LEDGER_CHUNK_ROWS = 5000
+
+def iter_ledger_chunks(ledger_path, chunk_size=LEDGER_CHUNK_ROWS):
+    """Yield the first sheet of a ledger workbook as DataFrames of chunk_size rows.
+
+    The workbook is opened read-only so only the current chunk is held in
+    memory. Cells keep the types openpyxl reads (no per-column dtype
+    inference), except that blank cells are NaN. As in pd.read_excel, blank
+    rows after the last row with data (read-only mode yields them for
+    formatted but empty rows) are dropped, and row labels continue across
+    chunks. Each chunk's attrs["total_rows"] holds the sheet's data row
+    count, less the blank rows not yet known to be followed by data, when
+    the workbook records its dimensions, else None.
+    """
+    import numpy as np
+    import pandas as pd
+    from openpyxl import load_workbook
+    workbook = load_workbook(ledger_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        header = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header_row)]
+        width = len(header)
+        sheet_rows = sheet.max_row - 1 if sheet.max_row else None
+        blank = (np.nan,) * width
+        # Blank rows since the last row with data; kept only if more data follows
+        blank_rows = 0
+
+        def make_chunk(chunk, start):
+            df = pd.DataFrame(chunk, columns=header, index=range(start, start + len(chunk)), dtype=object)
+            df.attrs["total_rows"] = sheet_rows - blank_rows if sheet_rows is not None else None
+            return df
+
+        start = 0
+        chunk = []
+        for row in rows:
+            row = tuple(np.nan if value is None or value == "" else value for value in row[:width])
+            if all(value is np.nan for value in row):
+                blank_rows += 1
                 continue
+            kept_blanks, blank_rows = blank_rows, 0
+            # A full chunk goes out once more data is seen, so the last one's total excludes trailing blanks
+            if len(chunk) >= chunk_size:
+                yield make_chunk(chunk, start)
+                start += len(chunk)
+                chunk = []
+            chunk.extend([blank] * kept_blanks)
+            chunk.append(row + (np.nan,) * (width - len(row)))
+        if chunk:
+            yield make_chunk(chunk, start)
+    finally:
+        workbook.close()
 
-            # Handle Txn Date
+def _stream_stats(rows_read, started):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return f"{rows_read} rows in {elapsed:.1f}s, {rows_read / elapsed:.0f} rows/sec, peak RSS {format_bytes(peak_rss_bytes())}"
+
+# Append mode: Receipt Nos already exported are recorded here, beside the CSV
+EXPORT_INDEX_NAME = "exported_receipts.sqlite"
+
+def export_index_path(output_csv):
+    return os.path.join(os.path.dirname(os.path.abspath(output_csv)), EXPORT_INDEX_NAME)
+
+def daily_output_path(output_dir):
+    # Rolling output of append runs: one CSV per day
+    return os.path.join(output_dir, f"purchase_{datetime.now().strftime('%Y-%m-%d')}.csv")
+
+# Function to create CSV from a ledger workbook in constant memory.
+# progress_callback(rows_read, total_rows, elapsed) runs after each chunk;
+# setting cancel_event stops between chunks and removes the partial CSV.
+# The ledger's stage times, rows and records are added to `metrics` (a
+# RunMetrics), if given. With an export_index (an ExportIndex), rows whose
+# Receipt No was exported before are skipped and the rest are appended to
+# output_path; a cancelled append keeps the chunks already appended. Each
+# chunk's rows also go to the extra output_formats (see output_writers).
+def stream_csv(ledger_path, output_path, log_callback, chunk_size=LEDGER_CHUNK_ROWS,
+               progress_callback=None, cancel_event=None, metrics=None, export_index=None, output_formats=()):
+    timer = StageTimer()
+    try:
+        return _stream_csv(ledger_path, output_path, log_callback, chunk_size, progress_callback, cancel_event, timer,
+                           export_index, output_formats)
+    finally:
+        if metrics is not None:
             try:
-                txn_date = pd.to_datetime(row['Txn Date'])
-                if pd.isna(txn_date):  # Check for NaT
-                    log_callback(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing or invalid Txn Date: {row['Txn Date']}")
-                    logger.warning(f"Skipping row {idx} with Receipt No.: {receipt_no} due to missing or invalid Txn Date: {row['Txn Date']}")
-                    continue
-                vendor_inv_date = txn_date.strftime("%d-%b-%Y")
-            except Exception as e:
-                log_callback(f"Skipping row {idx} with Receipt No.: {receipt_no} due to invalid Txn Date: {str(e)}")
-                logger.warning(f"Skipping row {idx} with Receipt No.: {receipt_no} due to invalid Txn Date: {e}")
-                continue
+                timer.count("bytes", os.path.getsize(ledger_path))
+            except OSError:
+                pass
+            metrics.add_file(ledger_path, timer)
 
-            # Custom logic for ABBOTT HEALTHCARE PRIVATE LIMITED
-            consignee_name = row.get('Consignee Name', '').strip()
-            # Match any Consignee Name that starts with 'ABBOTT HEALTHCARE' (case-insensitive)
-            if consignee_name.upper().startswith("ABBOTT HEALTHCARE"):
-                charge_or_gl_name = "GATE PASS CHARGES - REIM"
-                charge_or_gl_amount = "336"
-                taxcode1 = ""
-                taxcode1_amt = ""
-                taxcode2 = ""
-                taxcode2_amt = ""
-                amount = "336"
-                avail_tax_credit = "No"
-            else:
-                charge_or_gl_name = "GATE PASS CHARGES CCL"
-                charge_or_gl_amount = "285"
-                taxcode1 = "Central GST"
-                taxcode1_amt = "25.65"
-                taxcode2 = "State GST"
-                taxcode2_amt = "25.65"
-                avail_tax_credit = "100"
-                amount = "285"
-
-            job_no = get_job_number(boe_no, log_callback)
-            if job_no and job_no != "NA":
-                narration = f"Being Entry posted for Gatepass / Kale Logistics / {job_no}"
-            else:
-                narration = "Being Entry posted for Gatepass / Kale Logistics"
-            data = {
-                "Entry Date": today,
-                "Posting Date": today,
-                "Organization": "KALE LOGISTICS SOLUTIONS PVT LTD",
-                "Organization Branch": "THANE",
-                "Vendor Inv No": receipt_no,
-                "Vendor Inv Date": vendor_inv_date,
-                "Currency": "INR",
-                "ExchRate": "1",
-                "Narration": narration,
-                "Due Date": "",
-                "Charge or GL": "Charge",
-                "Charge or GL Name": charge_or_gl_name,
-                "Charge or GL Amount": charge_or_gl_amount,
-                "DR or CR": "Dr",
-                "Cost Center": "",
-                "Branch": "HO",
-                " Charge Narration": "GATE PASS CHARGES",
-                "TaxGroup": "GSTIN",
-                "Tax Type": "Taxable",
-                "SAC or HSN": "996712",
-                "Taxcode1": taxcode1,
-                "Taxcode1 Amt": taxcode1_amt,
-                "Taxcode2": taxcode2,
-                "Taxcode2 Amt": taxcode2_amt,
-                "Taxcode3": "",
-                "Taxcode3 Amt": "",
-                "Taxcode4": "",
-                "Taxcode4 Amt": "",
-                "Avail Tax Credit": avail_tax_credit,
-                "LOB": "CCL IMP",
-                "Ref Type": "",
-                "Ref No": job_no,
-                "Amount": amount,
-                "Start Date": "",
-                "End Date": "",
-                "WH Tax Code": "",
-                "WH Tax Percentage": "",
-                "WH Tax Taxable": "",
-                "WH Tax Amount": "",
-                "Round Off": "Yes",
-                "CC Code": ""
-            }
-            data_list.append(data)
-        if not data_list:
+def _stream_csv(ledger_path, output_path, log_callback, chunk_size, progress_callback, cancel_event, timer,
+                export_index=None, output_formats=()):
+    log_callback("Creating CSV file (streaming)...")
+    started = time.perf_counter()
+    rows_read = 0
+    records = 0
+    already_exported = 0
+    append = export_index is not None
+    extra = None
+    try:
+        today = datetime.now().strftime("%d-%b-%Y")  # e.g., 14-Jun-2025
+        chunks = iter_ledger_chunks(ledger_path, chunk_size)
+        while True:
+            with timer("excel_load"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            rows_read += len(chunk)
+            timer.count("rows", len(chunk))
+            df = build_purchase_frame(chunk, today, log_callback, timer)
+            if append and not df.empty:
+                with timer("export_index"):
+                    df, keys, skipped = _unexported_rows(df, export_index)
+                already_exported += skipped
+            if not df.empty:
+                # Header goes out with the first non-empty chunk; later chunks append
+                if append:
+                    header = records == 0 and (not os.path.isfile(output_path) or os.path.getsize(output_path) == 0)
+                    mode = 'a'
+                else:
+                    header = records == 0
+                    mode = 'w' if records == 0 else 'a'
+                with timer("csv_write"):
+                    df.to_csv(output_path, index=False, mode=mode, header=header)
+                    if output_formats:
+                        if extra is None:
+                            # to_csv ends lines with os.linesep
+                            extra = ExtraOutputs(output_path, output_formats, df.columns, append, os.linesep)
+                        extra.write(df.astype(object).where(df.notna(), None).to_numpy().tolist())
+                if append:
+                    with timer("export_index"):
+                        export_index.add(keys, os.path.basename(output_path))
+                records += len(df)
+                timer.count("records", len(df))
+            log_callback(f"Processed {_stream_stats(rows_read, started)}")
+            if progress_callback:
+                progress_callback(rows_read, chunk.attrs.get("total_rows"), time.perf_counter() - started)
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info(f"Processing cancelled after {rows_read} rows")
+                if append:
+                    # Earlier rows of the daily file are not ours to remove
+                    log_callback(f"Processing cancelled after {rows_read} rows; {records} records appended")
+                    return False
+                log_callback(f"Processing cancelled after {rows_read} rows; partial CSV removed")
+                if records and os.path.exists(output_path):
+                    os.remove(output_path)
+                if extra is not None:
+                    extra.discard()
+                return False
+        if already_exported:
+            log_callback(f"Skipped {already_exported} rows whose Receipt No. was already exported")
+        if records == 0 and already_exported:
+            log_callback("All valid rows were already exported; nothing appended")
+            return True
+        if records == 0:
             log_callback("No valid rows to process for CSV creation.")
             logger.warning("No valid rows to process for CSV creation.")
             return False
-        df = pd.DataFrame(data_list)
-        df.to_csv(output_path, index=False)
-        log_callback(f"CSV saved to {output_path} with {len(data_list)} records")
+        if append:
+            log_callback(f"Appended {records} records to {output_path}")
+        else:
+            log_callback(f"CSV saved to {output_path} with {records} records")
+        logger.info(f"Streamed {output_path}: {records} records, {_stream_stats(rows_read, started)}")
         return True
     except Exception as e:
         log_callback(f"Failed to create CSV: {str(e)}")
         logger.error(f"Failed to create CSV: {e}")
         return False
+    finally:
+        if extra is not None:
+            extra.close()
+
+# Drop rows whose Receipt No. (Vendor Inv No) is in export_index or repeats an
+# earlier row; returns (rows, their keys, rows dropped)
+def _unexported_rows(df, export_index):
+    keys = df["Vendor Inv No"].map(str).str.strip()
+    exported = export_index.exported(keys)
+    keep = ~keys.duplicated()
+    if exported:
+        keep &= ~keys.isin(exported)
+    return df[keep], keys[keep].tolist(), int((~keep).sum())
+
+# Write the run summary (JSON) and Prometheus textfile; failures are only logged
+def save_metrics(metrics, json_path, prometheus_path, log_callback):
+    try:
+        if json_path:
+            metrics.write_json(json_path)
+        if prometheus_path:
+            metrics.write_prometheus(prometheus_path)
+    except OSError as e:
+        log_callback(f"Could not write run metrics: {e}")
+        logger.error(f"Could not write run metrics: {e}")
 
 # Tkinter GUI
 class LedgerApp:
@@ -260,6 +750,11 @@ class LedgerApp:
         self.job_register_path = None
         self._logo_image = None
 
+        # Background processing: the worker thread posts events, the UI drains them
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
+
         # Setup Styles
         self._setup_styles()
 
@@ -267,9 +762,29 @@ class LedgerApp:
         self._create_widgets()
 
         # Logging Setup
-        text_handler = TextHandler(self.log_text)
+        text_handler = TextHandler(self.events)
         text_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        logger.addHandler(text_handler)
+        log_pipeline.add_sink(text_handler)
+
+        self.root.after(100, self._drain_events)
+        # Runs once the window has been drawn
+        self.root.after_idle(self._load_logo)
+
+    # Load the logo with PIL, falling back to the text label if either is missing
+    def _load_logo(self):
+        logo_path = resource_path("logo.png")
+        if not os.path.isfile(logo_path):
+            return
+        try:
+            from PIL import Image, ImageTk
+            img = Image.open(logo_path)
+            h = 40
+            w = int(img.width * h / img.height)
+            img = img.resize((w, h), Image.LANCZOS)
+            self._logo_image = ImageTk.PhotoImage(img)
+            self.logo_label.configure(image=self._logo_image)
+        except Exception:
+            pass
 
     def _setup_styles(self):
         style = ttk.Style()
@@ -330,20 +845,9 @@ class LedgerApp:
         header_frame.pack(fill=tk.X)
         tk.Frame(main_frame, bg=BORDER_COLOR, height=1).pack(fill=tk.X)
 
-        # Logo
-        logo_path = resource_path("logo.png")
-        if HAS_PIL and os.path.isfile(logo_path):
-            try:
-                img = Image.open(logo_path)
-                h = 40
-                w = int(img.width * h / img.height)
-                img = img.resize((w, h), Image.LANCZOS)
-                self._logo_image = ImageTk.PhotoImage(img)
-                tk.Label(header_frame, image=self._logo_image, bg=CARD_BG).pack(side=tk.LEFT)
-            except Exception:
-                tk.Label(header_frame, text="NAGARKOT", font=("Segoe UI", 12, "bold"), fg=ACCENT, bg=CARD_BG).pack(side=tk.LEFT)
-        else:
-            tk.Label(header_frame, text="NAGARKOT", font=("Segoe UI", 12, "bold"), fg=ACCENT, bg=CARD_BG).pack(side=tk.LEFT)
+        # Logo - text until _load_logo swaps in the image
+        self.logo_label = tk.Label(header_frame, text="NAGARKOT", font=("Segoe UI", 12, "bold"), fg=ACCENT, bg=CARD_BG)
+        self.logo_label.pack(side=tk.LEFT)
 
         # Centered Title
         title_label = tk.Label(
@@ -398,11 +902,31 @@ class LedgerApp:
             command=self.process_files,
             style="Accent.TButton"
         )
-        self.process_button.pack(side=tk.LEFT, padx=(0, 20))
+        self.process_button.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.cancel_button = ttk.Button(action_frame, text="Cancel", command=self.cancel_processing, style="Modern.TButton")
+        self.cancel_button.pack(side=tk.LEFT, padx=(0, 20))
+        self.cancel_button.state(['disabled'])
 
         self.status_label_main = tk.Label(action_frame, text="Ready", fg=TEXT_SECONDARY, bg=BG_COLOR, font=("Segoe UI", 9))
         self.status_label_main.pack(side=tk.LEFT)
 
+        self.append_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            action_frame, text="Append to today's CSV (skip exported receipts)", variable=self.append_var,
+            fg=TEXT_SECONDARY, bg=BG_COLOR, activebackground=BG_COLOR, font=("Segoe UI", 9),
+        ).pack(side=tk.RIGHT)
+
+        # Progress
+        progress_frame = tk.Frame(body, bg=BG_COLOR)
+        progress_frame.pack(fill=tk.X, pady=(0, 20))
+
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 15))
+
+        self.progress_label = tk.Label(progress_frame, text="", fg=TEXT_SECONDARY, bg=BG_COLOR, font=("Segoe UI", 9))
+        self.progress_label.pack(side=tk.LEFT)
+
         # Log Card
         log_card = ttk.LabelFrame(body, text="  Processing Log  ", style="Card.TLabelframe", padding=15)
         log_card.pack(fill=tk.BOTH, expand=True)
@@ -431,11 +955,44 @@ class LedgerApp:
         ttk.Button(footer_frame, text="Exit", command=self.root.destroy, style="Modern.TButton").pack(side=tk.RIGHT)
 
     def log(self, message):
+        # Safe from any thread; the text is inserted by _drain_events
+        self.events.put(("text", f"{datetime.now().strftime('%H:%M:%S')}: {message}"))
+
+    def _drain_events(self):
+        lines = []
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == "text":
+                    lines.append(event[1])
+                    continue
+                # Flush pending log lines before handling a state change
+                self._append_log(lines)
+                lines = []
+                if event[0] == "progress":
+                    self._show_progress(*event[1:])
+                elif event[0] == "done":
+                    self._finish_processing(*event[1:])
+        except queue.Empty:
+            pass
+        self._append_log(lines)
+        self.root.after(100, self._drain_events)
+
+    def _append_log(self, lines):
+        if not lines:
+            return
         self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')}: {message}\n")
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
         self.log_text.config(state='disabled')
         self.log_text.see(tk.END)
-        self.root.update()
+
+    def _show_progress(self, rows_done, rows_total, elapsed):
+        if rows_total:
+            self.progress_bar.config(mode="determinate", maximum=rows_total, value=min(rows_done, rows_total))
+        else:
+            self.progress_bar.config(mode="indeterminate")
+            self.progress_bar.step(5)
+        self.progress_label.config(text=format_progress(rows_done, rows_total, elapsed, unit="rows"))
 
     def select_job_register(self):
         global JOB_REGISTER_PATH
@@ -480,27 +1037,22 @@ class LedgerApp:
             self.log("No Job Register file selected.")
             return
             
-        self.status_label_main.config(text="Processing...", fg=ACCENT)
-        self.process_button.state(['disabled'])
-        self.log("Starting processing...")
-        self.root.update()
-
         # Create output directory
-        if getattr(sys, 'frozen', False):
-            base_dir = os.path.dirname(sys.executable)
-        else:
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-        output_dir = os.path.join(base_dir, 'Kale Output')
+        output_dir = os.path.join(app_base_dir(), 'Kale Output')
         os.makedirs(output_dir, exist_ok=True)
         logger.info(f"Output directory: {output_dir}")
 
         # Generate output CSV path
-        timestamp = datetime.now().strftime("%d-%m-%y %H-%M")
-        output_csv = os.path.join(output_dir, f"purchase_{timestamp}.csv")
+        append = self.append_var.get()
+        if append:
+            output_csv = daily_output_path(output_dir)
+        else:
+            timestamp = datetime.now().strftime("%d-%m-%y %H-%M")
+            output_csv = os.path.join(output_dir, f"purchase_{timestamp}.csv")
         logger.info(f"Output CSV: {output_csv}")
 
         # Check if CSV exists
-        if os.path.exists(output_csv):
+        if os.path.exists(output_csv) and not append:
             response = messagebox.askyesno(
                 "File Exists",
                 f"CSV file {os.path.basename(output_csv)} already exists. Overwrite?",
@@ -509,43 +1061,223 @@ class LedgerApp:
             if not response:
                 self.log(f"Cancelled overwrite.")
                 self.status_label_main.config(text="Cancelled", fg=TEXT_SECONDARY)
-                self.process_button.state(['!disabled'])
                 return
 
-        # Read Ledger Report
+        self.status_label_main.config(text="Processing...", fg=ACCENT)
+        self.process_button.state(['disabled'])
+        self.cancel_button.state(['!disabled'])
+        self.log("Starting processing...")
+        self.progress_bar.config(value=0)
+        self.progress_label.config(text="")
+
+        self.cancel_event.clear()
+        self.worker = threading.Thread(target=self._process_ledger, args=(self.ledger_path, output_csv, append), daemon=True)
+        self.worker.start()
+
+    def cancel_processing(self):
+        if self.worker and self.worker.is_alive():
+            self.cancel_event.set()
+            self.cancel_button.state(['disabled'])
+            self.status_label_main.config(text="Cancelling...", fg=TEXT_SECONDARY)
+            self.log("Cancel requested; stopping after the current chunk")
+
+    def _process_ledger(self, ledger_path, output_csv, append=False):
+        # Runs on the worker thread: no Tk calls here, only self.log / self.events
+        def post_progress(rows_done, rows_total, elapsed):
+            self.events.put(("progress", rows_done, rows_total, elapsed))
+
+        # Stream the Ledger Report into the CSV chunk by chunk
+        export_index = None
         try:
-            ledger_data = pd.read_excel(self.ledger_path, engine='openpyxl')
-            self.log(f"Loaded Ledger Report: {len(ledger_data)} rows")
+            metrics = RunMetrics("ledger")
+            try:
+                # Opened in here: a locked or unwritable index is reported like any other failure
+                if append:
+                    export_index = ExportIndex(export_index_path(output_csv))
+                ok = stream_csv(ledger_path, output_csv, self.log, progress_callback=post_progress,
+                                cancel_event=self.cancel_event, metrics=metrics, export_index=export_index)
+            finally:
+                if export_index is not None:
+                    export_index.close()
+            metrics.finish("cancelled" if self.cancel_event.is_set() else "success" if ok else "failed")
+            logger.info(f"Run {metrics.outcome} in {metrics.duration:.1f}s; stage times: {metrics.stage_report()}")
+            save_metrics(metrics, metrics_path_for(output_csv), None, self.log)
+            if self.cancel_event.is_set():
+                self.events.put(("done", "cancelled", None))
+            elif ok:
+                self.log(f"CSV generated: {os.path.basename(output_csv)}")
+                self.events.put(("done", "success", f"CSV saved to {output_csv}"))
+            else:
+                self.log("Failed to generate CSV.")
+                self.events.put(("done", "error", "Failed to generate CSV."))
         except Exception as e:
-            self.log(f"Failed to load Ledger Report: {str(e)}")
-            self.status_label_main.config(text="Error loading file", fg=ERROR_RED)
-            messagebox.showerror("Error", f"Failed to load Ledger Report: {str(e)}")
-            self.process_button.state(['!disabled'])
-            return
+            # Always post "done", or Process stays disabled and Cancel enabled
+            self.log(f"Processing failed: {str(e)}")
+            logger.error(f"Processing failed: {e}")
+            self.events.put(("done", "error", f"Processing failed: {e}"))
 
-        # Create CSV
-        if create_csv(ledger_data, output_csv, self.log):
+    def _finish_processing(self, outcome, message):
+        self.process_button.state(['!disabled'])
+        self.cancel_button.state(['disabled'])
+        if self.progress_bar.cget("mode") == "indeterminate":
+            self.progress_bar.config(mode="determinate", value=0)
+        if outcome == "success":
             self.status_label_main.config(text="Completed Successfully", fg=SUCCESS_GREEN)
-            self.log(f"CSV generated: {os.path.basename(output_csv)}")
-            messagebox.showinfo("Success", f"CSV saved to {output_csv}")
+            messagebox.showinfo("Success", message)
+        elif outcome == "cancelled":
+            self.status_label_main.config(text="Cancelled", fg=TEXT_SECONDARY)
         else:
             self.status_label_main.config(text="Failed", fg=ERROR_RED)
-            self.log("Failed to generate CSV.")
-            messagebox.showerror("Error", "Failed to generate CSV.")
-            
-        self.process_button.state(['!disabled'])
+            messagebox.showerror("Error", message)
+
+# Command line
+def _convert_ledger_worker(ledger_path, output_csv, job_register_path, chunk_size, output_formats=()):
+    # Runs in a pool process: log messages are collected and replayed by the parent
+    global JOB_REGISTER_PATH
+    JOB_REGISTER_PATH = job_register_path
+    messages = []
+    metrics = RunMetrics("ledger")
+    return stream_csv(ledger_path, output_csv, messages.append, chunk_size, metrics=metrics,
+                      output_formats=output_formats), messages, metrics
+
+def cli_main(argv=None):
+    """Convert ledgers without the GUI; returns a batch_cli EXIT_* code."""
+    global JOB_REGISTER_PATH
+    parser = argparse.ArgumentParser(
+        prog="Ledger_to_CSV",
+        description="Convert Kale ledger reports to Logisys purchase CSVs without the GUI.",
+    )
+    parser.add_argument("inputs", nargs="+", help="ledger workbooks (.xlsx), folders of them or glob patterns (quote them)")
+    parser.add_argument("-j", "--job-register", required=True, help="job register with BOE and Job No columns (.csv, .xlsx)")
+    parser.add_argument("-o", "--output", help="output folder, or a .csv path when converting one ledger (default: 'Kale Output')")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="ledgers converted in parallel processes (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=LEDGER_CHUNK_ROWS, help=f"ledger rows per streaming chunk (default: {LEDGER_CHUNK_ROWS})")
+    parser.add_argument("--overwrite", action="store_true", help="replace output CSVs that already exist")
+    parser.add_argument("--append", action="store_true", help="append every ledger to one CSV (default: purchase_<date>.csv in the output folder), skipping Receipt Nos already exported (recorded in exported_receipts.sqlite beside it)")
+    parser.add_argument("--format", dest="formats", action="append", default=[], choices=OUTPUT_FORMATS,
+                        help="also write the rows in this format beside each CSV; may be repeated (parquet needs pyarrow, csv.zst needs zstandard)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary and errors")
+    parser.add_argument("-v", "--verbose", action="store_true", help=f"also log DEBUG detail (same as {log_pipeline.LOG_LEVEL_ENV}=DEBUG)")
+    batch_cli.add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    log = batch_cli.console_logger(args.quiet)
+    if args.verbose:
+        log_pipeline.set_level(logging.DEBUG)
+
+    ledger_paths = batch_cli.expand_input_paths(args.inputs, (".xlsx",))
+    missing = [path for path in ledger_paths if not os.path.isfile(path)]
+    if missing:
+        print(f"Error: input not found: {', '.join(missing)}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    if not ledger_paths:
+        print("Error: no ledger workbooks matched the inputs", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    if not os.path.isfile(args.job_register):
+        print(f"Error: job register not found: {args.job_register}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    JOB_REGISTER_PATH = args.job_register
+    format_error = check_formats(args.formats, args.append)
+    if format_error:
+        print(f"Error: {format_error}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+
+    # One CSV per ledger, named after it, unless a single ledger gets an explicit .csv path
+    output = args.output or os.path.join(app_base_dir(), 'Kale Output')
+    if args.append:
+        csv_path = output if output.lower().endswith('.csv') else daily_output_path(output)
+        jobs = [(path, csv_path) for path in ledger_paths]
+    elif output.lower().endswith('.csv'):
+        if len(ledger_paths) > 1:
+            print("Error: --output must be a folder when converting more than one ledger", file=sys.stderr)
+            return batch_cli.EXIT_USAGE
+        jobs = [(ledger_paths[0], output)]
+    else:
+        jobs = [
+            (path, os.path.join(output, f"purchase_{os.path.splitext(os.path.basename(path))[0]}.csv"))
+            for path in ledger_paths
+        ]
+    existing = [csv_path for _, csv_path in jobs if os.path.exists(csv_path)]
+    if existing and not (args.overwrite or args.append):
+        print(f"Error: already exists (use --overwrite to replace): {', '.join(existing)}", file=sys.stderr)
+        return batch_cli.EXIT_USAGE
+    for _, csv_path in jobs:
+        os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+
+    logger.info(f"Command-line run: {len(jobs)} ledgers")
+    results = []
+    metrics = RunMetrics("ledger")
+    export_index = ExportIndex(export_index_path(jobs[0][1])) if args.append else None
+    try:
+        # Appends go to one file, so ledgers are converted one after another
+        workers = 1 if args.append else min(max(1, args.workers), len(jobs))
+        if workers == 1:
+            for ledger_path, csv_path in jobs:
+                log(f"Converting {os.path.basename(ledger_path)}")
+                results.append(stream_csv(ledger_path, csv_path, log, args.chunk_size, metrics=metrics,
+                                          export_index=export_index, output_formats=args.formats))
+        else:
+            initializer, initargs = log_pipeline.worker_initializer()
+            with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+                futures = [
+                    pool.submit(_convert_ledger_worker, ledger_path, csv_path, JOB_REGISTER_PATH, args.chunk_size,
+                                args.formats)
+                    for ledger_path, csv_path in jobs
+                ]
+                for (ledger_path, _), future in zip(jobs, futures):
+                    log(f"Converting {os.path.basename(ledger_path)}")
+                    try:
+                        ok, messages, worker_metrics = future.result()
+                        metrics.absorb(worker_metrics)
+                    except Exception as e:
+                        ok, messages = False, [f"Failed to convert {ledger_path}: {e}"]
+                    for message in messages:
+                        log(message)
+                    results.append(ok)
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return batch_cli.EXIT_INTERRUPTED
+    except Exception as e:
+        logger.error(f"Command-line run failed: {e}")
+        print(f"Error: processing failed: {e}", file=sys.stderr)
+        return batch_cli.EXIT_FAILED
+    finally:
+        if export_index is not None:
+            export_index.close()
+
+    metrics.finish("success" if all(results) else "partial" if any(results) else "failed")
+    logger.info(f"Command-line run {metrics.outcome} in {metrics.duration:.1f}s; stage times: {metrics.stage_report()}")
+    if args.metrics_json:
+        metrics_json = args.metrics_json
+    elif len(jobs) == 1 or args.append:
+        metrics_json = metrics_path_for(jobs[0][1])
+    else:
+        metrics_json = os.path.join(output, f"purchase_run_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.metrics.json")
+    save_metrics(metrics, metrics_json, args.prometheus, log)
+
+    for (ledger_path, csv_path), ok in zip(jobs, results):
+        print(f"{ledger_path} -> {csv_path if ok else 'FAILED'}")
+    if all(results):
+        return batch_cli.EXIT_OK
+    return batch_cli.EXIT_PARTIAL if any(results) else batch_cli.EXIT_NO_DATA
 
 # Main
 def main():
+    # Needed for worker processes in the frozen (PyInstaller) executable
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(cli_main(sys.argv[1:]))
     try:
-        logger.info("Starting Ledger to Purchase Converter")
+        load_gui()
         root = tk.Tk()
         app = LedgerApp(root)
+        root.after_idle(logger.info, "Starting Ledger to Purchase Converter")
+        schedule_startup_probe(root)
         root.mainloop()
         logger.info("Application closed")
     except Exception as e:
         logger.error(f"Application error: {e}")
-        messagebox.showerror("Error", f"Application error: {e}")
+        if messagebox is not None:
+            messagebox.showerror("Error", f"Application error: {e}")
 
 if __name__ == "__main__":
     main()
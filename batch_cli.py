@@ -0,0 +1,64 @@
+"""Helpers shared by the command-line modes of the HASTI and Ledger converters.
+
+Nothing here (or in the converters' command-line paths) imports tkinter or
+PIL, so batches can run from cron or a scheduler on a host with no display.
+"""
+import glob
+import os
+import sys
+from datetime import datetime
+
+# Process exit codes
+EXIT_OK = 0                # every input converted
+EXIT_PARTIAL = 1           # output written, but some inputs gave no records
+EXIT_USAGE = 2             # bad arguments, missing inputs or job register
+EXIT_NO_DATA = 3           # nothing could be extracted, no output written
+EXIT_FAILED = 4            # output could not be written or the run crashed
+EXIT_INTERRUPTED = 130     # stopped with Ctrl+C
+
+
+def expand_input_paths(inputs, extensions):
+    """Resolve files, directories and glob patterns to a sorted, de-duplicated file list.
+
+    Directories contribute their files (not sub-directories) whose extension
+    is in `extensions`; glob patterns may use ** for recursion.
+    """
+    paths = []
+    seen = set()
+
+    def add(path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            paths.append(path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                path = os.path.join(item, name)
+                if os.path.isfile(path) and name.lower().endswith(extensions):
+                    add(path)
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(extensions):
+                    add(path)
+        else:
+            add(item)
+    return paths
+
+
+def console_logger(quiet=False):
+    """log_callback for command-line runs: timestamped lines on stderr."""
+    def log(message):
+        if not quiet:
+            print(f"{datetime.now().strftime('%H:%M:%S')}: {message}", file=sys.stderr, flush=True)
+    return log
+
+
+def add_metrics_arguments(parser):
+    """--metrics-json / --prometheus options for the per-run stage metrics."""
+    group = parser.add_argument_group("metrics")
+    group.add_argument("--metrics-json", metavar="PATH",
+                       help="run summary with per-stage and per-file timings (default: next to the output, *.metrics.json)")
+    group.add_argument("--prometheus", metavar="PATH",
+                       help="also write the run metrics as a Prometheus textfile (e.g. for node_exporter's textfile collector)")
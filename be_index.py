@@ -0,0 +1,73 @@
+"""Job register index by BE (bill of entry) number, with near-miss suggestions."""
+DIGITS = "0123456789"
+
+
+def normalize_be_no(value):
+    """Matching key for a BE number: no whitespace, no trailing .0, no leading zeros."""
+    key = "".join(str(value).split())
+    if key.endswith(".0") and key[:-2].isdigit():
+        key = key[:-2]
+    if key.isdigit():
+        key = key.lstrip("0") or "0"
+    return key.upper()
+
+
+class BEIndex:
+    """BE number -> job number, built once from (be_no, job_no) pairs.
+
+    lookup() tries the BE number exactly as written, then its normalised
+    key; where a number appears more than once the first row wins, as with
+    the old linear scan. suggest() returns register numbers within one
+    edit of a number that did not match: a digit added, dropped or changed,
+    or two adjacent digits swapped. BE numbers are short and all digits, so
+    it looks up every such variant of the number (about 150 for 7 digits)
+    in the normalised index instead of building a second index.
+    """
+
+    def __init__(self, pairs):
+        self.entries = []
+        self.exact = {}
+        self.normalized = {}
+        for be_no, job_no in pairs:
+            self.entries.append((be_no, job_no))
+            self.exact.setdefault(be_no, job_no)
+            key = normalize_be_no(be_no)
+            if key and key != "NAN":
+                self.normalized.setdefault(key, (be_no, job_no))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def lookup(self, be_no):
+        """The job number for be_no, or None if it is not in the register."""
+        be_no = str(be_no).strip()
+        if be_no in self.exact:
+            return self.exact[be_no]
+        match = self.normalized.get(normalize_be_no(be_no))
+        return match[1] if match is not None else None
+
+    def suggest(self, be_no, limit=3):
+        """Up to `limit` (be_no, job_no) register entries one edit away from be_no."""
+        key = normalize_be_no(be_no)
+        if not key.isdigit():
+            return []
+        matches = sorted(variant for variant in _one_edit_variants(key) if variant in self.normalized)
+        return [self.normalized[variant] for variant in matches[:limit]]
+
+
+def _one_edit_variants(key):
+    variants = set()
+    for i in range(len(key) + 1):
+        for digit in DIGITS:
+            variants.add(key[:i] + digit + key[i:])
+    for i in range(len(key)):
+        variants.add(key[:i] + key[i + 1:])
+        for digit in DIGITS:
+            variants.add(key[:i] + digit + key[i + 1:])
+    for i in range(len(key) - 1):
+        variants.add(key[:i] + key[i + 1] + key[i] + key[i + 2:])
+    variants.discard(key)
+    return variants
@@ -0,0 +1,93 @@
+"""Parity check of the HASTI text backends: the fast ones must give pdfplumber's records.
+
+Writes a synthetic corpus of invoices (synthetic_corpus.write_invoices)
+and of tabular invoices whose drawing order differs from their layout
+(synthetic_corpus.write_tabular_invoices), adds any PDFs named on the
+command line, and extracts each one three ways: with the pdfium backend
+alone, with the default fast backends (pdfium, then a learned template)
+and with pdfplumber alone. The records must be identical; a fast backend
+whose text is missing or doubtful for a field falls back to pdfplumber,
+so a difference means a value it did not doubt was wrong.
+
+Usage:
+  python benchmarks/backend_parity.py --invoices 50
+  python benchmarks/backend_parity.py "invoices/2025/*.pdf" --invoices 0
+
+Exits with 1 and prints MISMATCH lines if any PDF's records differ.
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import synthetic_corpus  # noqa: E402
+
+
+def quiet(message):
+    pass
+
+
+def records(hasti, pdf_path, backends, log_callback=quiet):
+    text, tables_data = hasti.extract_text_from_pdf(pdf_path, log_callback, backends=backends)
+    if not text:
+        return None
+    return hasti.extract_invoice_details_with_regex(text, tables_data, quiet)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the fast HASTI text backends give pdfplumber's records.")
+    parser.add_argument("inputs", nargs="*", help="more invoice PDFs, folders of PDFs or glob patterns (quote them)")
+    parser.add_argument("--invoices", type=int, default=20,
+                        help="synthetic invoices of each layout, flowed and tabular (default: 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="keep the corpus here instead of a temporary folder")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="converter_parity_")
+    os.makedirs(work_dir, exist_ok=True)
+    logging.basicConfig(handlers=[logging.FileHandler(os.path.join(work_dir, "parity.log"))], level=logging.INFO)
+    # Learned templates stay in the work folder, out of the user's HASTI_Cache
+    os.environ["HASTI_CACHE_DIR"] = os.path.join(work_dir, "HASTI_Cache")
+    import HASTI_Invoice_to_CSV as hasti
+    import batch_cli
+
+    mismatches = []
+    fallbacks = 0
+    try:
+        boes = synthetic_corpus.register_boes(1000, args.seed)
+        pdf_paths = (
+            synthetic_corpus.write_invoices(os.path.join(work_dir, "invoices"), args.invoices, boes, args.seed)
+            + synthetic_corpus.write_tabular_invoices(os.path.join(work_dir, "tabular"), args.invoices, boes, args.seed)
+            + batch_cli.expand_input_paths(args.inputs, (".pdf",))
+        )
+        for pdf_path in pdf_paths:
+            expected = records(hasti, pdf_path, ())
+            for backends in (("pdfium",), hasti.FAST_TEXT_BACKENDS):
+                messages = []
+                got = records(hasti, pdf_path, backends, messages.append)
+                fallbacks += any("falling back" in message for message in messages)
+                if got != expected:
+                    fields = sorted({key for a, b in zip(got or [], expected or []) for key in a if a[key] != b.get(key)})
+                    mismatches.append(f"{pdf_path} ({'+'.join(backends)}): "
+                                      + (", ".join(fields) if fields else f"{got!r} vs {expected!r}"))
+    finally:
+        logging.shutdown()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{len(pdf_paths)} PDFs, {2 * len(pdf_paths)} fast extractions compared with pdfplumber; "
+          f"{fallbacks} fell back to pdfplumber")
+    for mismatch in mismatches:
+        print(f"MISMATCH: {mismatch}", file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
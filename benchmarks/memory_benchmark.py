@@ -0,0 +1,113 @@
+"""Memory regression check for HASTI text extraction on a long PDF.
+
+Writes one synthetic invoice of --pages dense pages (see
+synthetic_corpus.write_statement), extracts it with
+extract_text_from_pdf in a fresh process and reports that process's peak
+RSS. pdfplumber keeps every parsed page's layout until the page is
+closed; extraction holds at most PDF_RESIDENT_PAGES of them, so the peak
+should not grow with the page count.
+
+Usage:
+  python benchmarks/memory_benchmark.py --pages 100 --max-rss-mb 250
+
+Exits with 1 and prints a REGRESSION line if the peak RSS is over
+--max-rss-mb.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import synthetic_corpus  # noqa: E402
+
+
+def measure(pdf_path, mode):
+    # Runs in the child process: prints one JSON line with the figures
+    import logging
+    logging.basicConfig(handlers=[logging.NullHandler()])
+    import HASTI_Invoice_to_CSV as hasti
+    from run_metrics import StageTimer, peak_rss_bytes
+    import pdfplumber  # noqa: F401
+    before = peak_rss_bytes()
+    timer = StageTimer()
+    started = time.perf_counter()
+    text, _ = hasti.extract_text_from_pdf(pdf_path, lambda message: None, mode=mode, timer=timer)
+    print(json.dumps({
+        "mode": mode,
+        "pages": timer.counts.get("pages", 0),
+        "pages_read": timer.counts.get("pages_read", 0),
+        "text_chars": len(text or ""),
+        "seconds": round(time.perf_counter() - started, 3),
+        "rss_before_bytes": before,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the peak memory of HASTI text extraction on a long PDF.")
+    parser.add_argument("--pages", type=int, default=100, help="pages in the synthetic PDF (default: 100)")
+    parser.add_argument("--mode", choices=["targeted", "full"], default="full",
+                        help="extract_text_from_pdf mode (default: full, which reads every page)")
+    parser.add_argument("--max-rss-mb", type=float, default=250,
+                        help="fail if the extracting process's peak RSS is over this (default: 250)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="keep the PDF here instead of a temporary folder")
+    parser.add_argument("--json", metavar="PATH", help="write the result to this JSON file")
+    parser.add_argument("--child", metavar="PDF", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        measure(args.child, args.mode)
+        return 0
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="converter_mem_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        pdf_path = synthetic_corpus.write_statement(
+            os.path.join(work_dir, f"statement_{args.pages}p.pdf"), args.pages, seed=args.seed
+        )
+        # A fresh process, so the peak is this extraction's and nothing else's; its
+        # cache folder (HASTI_CACHE_DIR) is the work folder, not the user's HASTI_Cache
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", pdf_path, "--mode", args.mode],
+            capture_output=True, text=True,
+            env={**os.environ, "HASTI_CACHE_DIR": os.path.join(work_dir, "HASTI_Cache")},
+        )
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if child.returncode != 0 or not child.stdout.strip():
+        print(child.stderr, file=sys.stderr)
+        print("Error: extraction process failed", file=sys.stderr)
+        return 2
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    result["max_rss_bytes"] = int(args.max_rss_mb * 1024 * 1024)
+
+    peak = result["peak_rss_bytes"]
+    print(f"{result['pages']} pages ({result['pages_read']} read, {args.mode}) in {result['seconds']:.1f} s; "
+          f"peak RSS {peak / 2**20:.0f} MB (after imports {result['rss_before_bytes'] / 2**20:.0f} MB), "
+          f"ceiling {args.max_rss_mb:.0f} MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if peak is None:
+        print("Peak RSS is not available on this platform", file=sys.stderr)
+        return 0
+    if peak > result["max_rss_bytes"]:
+        print(f"REGRESSION: peak RSS {peak / 2**20:.0f} MB is over the {args.max_rss_mb:.0f} MB ceiling",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Startup benchmark for the HASTI and Ledger converters.
+
+Each measurement runs in a fresh process and is repeated --runs times:
+
+  import:<module>  time to import the converter module, and which heavy
+                   packages (pandas, pdfplumber, PIL, tkinter...) it pulls in
+  window:<name>    time from launching the GUI (the script, or a frozen
+                   executable given with --exe) until its window is up
+
+Usage:
+  python benchmarks/startup_benchmark.py
+  python benchmarks/startup_benchmark.py --exe dist/HASTI_Invoice_to_CSV.exe --exe dist/Ledger_to_CSV.exe
+  python benchmarks/startup_benchmark.py --save-baseline startup_baseline.json
+  python benchmarks/startup_benchmark.py --baseline startup_baseline.json
+
+Exits with 1 if a converter imports a heavy package at module load, or if a
+median is more than --tolerance slower than the baseline. Window timings are
+skipped (not failed) where no display is available.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from run_metrics import STARTUP_PROBE_ENV  # noqa: E402
+
+CONVERTERS = ["HASTI_Invoice_to_CSV", "Ledger_to_CSV"]
+
+# Packages that must not be imported when a converter module is loaded
+HEAVY_MODULES = ["pandas", "numpy", "pdfplumber", "pdfminer", "openpyxl", "PIL", "tkinter"]
+
+IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {repo!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module):
+    code = IMPORT_PROBE.format(repo=REPO_DIR, module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return probe["seconds"], probe["heavy"]
+
+
+def time_first_window(command, timeout):
+    """Seconds from launch until the GUI reports its window, or None if it never does."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Run away from the repo so log files land in the temp folder; the
+        # scripts look for logo.png in the working directory
+        shutil.copy(os.path.join(REPO_DIR, "logo.png"), work_dir)
+        probe_path = os.path.join(work_dir, "first_window.txt")
+        env = dict(os.environ, **{STARTUP_PROBE_ENV: probe_path})
+        started = time.time()
+        try:
+            subprocess.run(command, cwd=work_dir, env=env, timeout=timeout,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except subprocess.TimeoutExpired:
+            return None
+        if not os.path.isfile(probe_path):
+            return None
+        with open(probe_path) as f:
+            return float(f.read()) - started
+
+
+def summarize(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        "median_ms": round(statistics.median(ms), 1),
+        "min_ms": round(min(ms), 1),
+        "max_ms": round(max(ms), 1),
+        "runs": len(ms),
+    }
+
+
+def run_benchmarks(args):
+    results = {}
+    heavy_imports = {}
+    for module in CONVERTERS:
+        samples = []
+        for _ in range(args.runs):
+            seconds, heavy = time_import(module)
+            samples.append(seconds)
+        heavy_imports[module] = heavy
+        results[f"import:{module}"] = summarize(samples)
+        print(f"import:{module}: {results[f'import:{module}']['median_ms']} ms (median of {args.runs})"
+              + (f"; heavy modules imported: {', '.join(heavy)}" if heavy else ""))
+
+    if args.exe:
+        targets = [(os.path.splitext(os.path.basename(exe))[0], [os.path.abspath(exe)]) for exe in args.exe]
+    else:
+        targets = [(module, [sys.executable, os.path.join(REPO_DIR, f"{module}.py")]) for module in CONVERTERS]
+    for name, command in targets:
+        samples = []
+        for _ in range(args.runs):
+            seconds = time_first_window(command, args.timeout)
+            if seconds is None:
+                break
+            samples.append(seconds)
+        if len(samples) < args.runs:
+            print(f"window:{name}: skipped (the window did not come up; no display or Tk?)")
+            continue
+        results[f"window:{name}"] = summarize(samples)
+        print(f"window:{name}: {results[f'window:{name}']['median_ms']} ms (median of {args.runs})")
+    return results, heavy_imports
+
+
+def find_regressions(results, baseline, tolerance, min_delta_ms):
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        delta = result["median_ms"] - base["median_ms"]
+        if delta > min_delta_ms and result["median_ms"] > base["median_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: {result['median_ms']} ms vs baseline {base['median_ms']} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure converter import time and time to first window.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement (default: 5)")
+    parser.add_argument("--exe", action="append", metavar="PATH",
+                        help="time this frozen executable's window instead of the scripts (repeatable)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for a window (default: 60)")
+    parser.add_argument("--json", metavar="PATH", help="write the results to this JSON file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against results saved with --save-baseline")
+    parser.add_argument("--save-baseline", metavar="PATH", help="save these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline as a fraction (default: 0.25)")
+    parser.add_argument("--min-delta-ms", type=float, default=20,
+                        help="ignore slowdowns smaller than this many ms (default: 20)")
+    args = parser.parse_args(argv)
+
+    results, heavy_imports = run_benchmarks(args)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+        "heavy_imports": heavy_imports,
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    failures = [f"{module} imports {', '.join(heavy)} at module load"
+                for module, heavy in heavy_imports.items() if heavy]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += find_regressions(results, json.load(f), args.tolerance, args.min_delta_ms)
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
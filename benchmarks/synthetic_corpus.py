@@ -0,0 +1,284 @@
+"""Synthetic HASTI invoices and Kale ledgers / job registers for benchmarks.
+
+The PDFs are written directly (no PDF library needed) with the same labels
+the HASTI field patterns look for; some invoices run to several pages of
+container lines before the totals. Everything is derived from a seed, so a
+corpus of a given size is the same on every machine.
+
+Usage:
+  python benchmarks/synthetic_corpus.py corpus/ --invoices 1000 --ledger-rows 100000 --register-rows 20000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+CONSIGNEES = [
+    "ABBOTT HEALTHCARE PRIVATE LIMITED",
+    "SUN PHARMACEUTICAL INDUSTRIES LTD",
+    "TORRENT PHARMACEUTICALS LTD",
+    "ZYDUS LIFESCIENCES LTD",
+    "INTAS PHARMACEUTICALS LTD",
+    "CADILA PHARMACEUTICALS LTD",
+]
+
+SERVICES = [
+    "CFS HANDLING SERVICES",
+    "GROUND RENT CHARGES",
+    "EXAMINATION CHARGES",
+    "SEAL VERIFICATION CHARGES",
+    "DOCUMENTATION CHARGES",
+]
+
+LEDGER_COLUMNS = ["Sr. No.", "Receipt No.", "BOE No.", "Txn Date", "Consignee Name", "Amount"]
+REGISTER_COLUMNS = ["BE No", "Job No"]
+
+
+def _pdf_string(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one Helvetica text line per entry of each page.
+
+    An entry is a line of text, set below the one before, or (x, y, text)
+    to set text at that position; entries are written in list order, which
+    is the order PDFium reads them in.
+    """
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    # Object ids are sequential, so the Pages id is known before it is written
+    pages_id = font_id + 2 * len(pages) + 1
+    page_ids = []
+    for lines in pages:
+        ops = ["BT /F1 10 Tf 14 TL 40 800 Td"]
+        for line in lines:
+            if isinstance(line, tuple):
+                x, y, line = line
+                ops.append(f"1 0 0 1 {x} {y} Tm")
+            ops.append(f"({_pdf_string(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def invoice_pages(number, boe_no, rng):
+    """Text lines, per page, of one HASTI DO invoice."""
+    transport = rng.random() < 0.3
+    amount = rng.randrange(200000, 20000000) / 100
+    gst = round(amount * 0.09, 2)
+    invoice_date = datetime(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    header = [
+        "HASTI PETRO CHEMICAL & SHIPPING LTD.",
+        "TAX INVOICE",
+        f"Invoice No. HPC/{number:06d}",
+        f"Invoice Date {invoice_date.strftime('%d-%m-%Y')}",
+        f"BOE No. {boe_no}-{(invoice_date - timedelta(days=2)).strftime('%d-%m-%Y')}",
+        f"BL No. BL{rng.randrange(10**8):08d}",
+        f"Consignee {rng.choice(CONSIGNEES)}",
+    ]
+    if transport:
+        services = ["TRANSPORTATION OF GOODS - ROAD"]
+    else:
+        services = rng.sample(SERVICES, rng.randrange(1, len(SERVICES) + 1))
+    # Long invoices: several pages of container lines before the totals
+    extra_pages = rng.choice([0, 0, 0, 1, 2, 4])
+    pages = [header + [f"{service} 1 {amount / len(services):,.2f}" for service in services]]
+    for _ in range(extra_pages):
+        pages.append([f"Container {rng.choice('ABCDEFGH')}{rng.randrange(10**7):07d} 20FT {rng.randrange(100, 999)}"
+                      for _ in range(40)])
+    pages[-1] = pages[-1] + [
+        f"Total Amount {amount:,.2f}",
+        f"CGST 9% {gst:,.2f}",
+        f"SGST 9% {gst:,.2f}",
+        f"Total Invoice Amount {amount + 2 * gst:,.2f}",
+    ]
+    return pages
+
+
+def tabular_invoice_pages(number, boe_no, rng):
+    """Positioned entries, per page, of a one-page invoice whose text order differs from its layout.
+
+    As PDF writers draw tables a column at a time, Invoice No. and BL No.
+    have their labels written before their values, and a wrapped
+    TRANSPORTATION OF / GOODS - ROAD service line has a remarks cell of
+    several lines written between its two lines. pdfplumber reads the
+    lines as laid out; PDFium reads the entries in written order.
+    """
+    pages = invoice_pages(number, boe_no, rng)
+    header, totals = pages[0][:7], pages[-1][-4:]
+    invoice_no, invoice_date, boe, bl_no = (line.split(" ", 2)[-1] for line in header[2:6])
+    entries = [
+        (40, 800, header[0]),
+        (40, 786, header[1]),
+        (40, 760, "Invoice No."),
+        (40, 746, "BL No."),
+        (160, 760, invoice_no),
+        (160, 746, bl_no),
+        (300, 760, f"Invoice Date {invoice_date}"),
+        (300, 746, f"BOE No. {boe}"),
+        (40, 720, header[6]),
+    ]
+    if rng.random() < 0.5:
+        entries.append((40, 690, "TRANSPORTATION OF"))
+        entries.extend((250, 690 - 14 * row, f"Containers {rng.choice('ABCDEFGH')}{rng.randrange(10**7):07d} "
+                        f"{rng.choice('ABCDEFGH')}{rng.randrange(10**7):07d} 20FT")
+                       for row in range(4))
+        entries.append((40, 676, "GOODS - ROAD"))
+    else:
+        entries.append((40, 690, f"{rng.choice(SERVICES)} 1"))
+    entries.extend((40, 600 - 14 * row, line) for row, line in enumerate(totals))
+    return [entries]
+
+
+def statement_pages(page_count, boe_no, seed=0):
+    """Text lines, per page, of one long invoice: page_count pages of dense container lines."""
+    rng = random.Random(f"statement-{seed}")
+    pages = invoice_pages(0, boe_no, rng)
+    first, totals = pages[0], pages[-1][-4:]
+    lines_per_page = 55
+    body = [
+        [f"Container {rng.choice('ABCDEFGH')}{rng.randrange(10**7):07d} 20FT {rng.randrange(100, 999)} "
+         f"{rng.choice(SERVICES)} 1 {rng.randrange(100000, 9999999) / 100:,.2f}" for _ in range(lines_per_page)]
+        for _ in range(max(0, page_count - 2))
+    ]
+    return [[line for line in first if line not in totals]] + body + [totals]
+
+
+def write_statement(path, page_count, boe_no=1234567, seed=0):
+    """Write a single invoice PDF of page_count pages (see statement_pages)."""
+    write_pdf(path, statement_pages(page_count, boe_no, seed))
+    return path
+
+
+def register_boes(rows, seed=0):
+    """The BOE numbers in a job register of `rows` rows (unique, 7 digits)."""
+    rng = random.Random(f"register-{seed}")
+    return rng.sample(range(1000000, 9999999), rows)
+
+
+def write_job_register(path, rows, seed=0):
+    """Job register with BE No / Job No columns, as .xlsx or .csv."""
+    records = ((boe, f"CCL/IMP/{index:06d}") for index, boe in enumerate(register_boes(rows, seed), 1))
+    _write_table(path, REGISTER_COLUMNS, records)
+
+
+def ledger_records(rows, boes, seed=0):
+    """Yield Kale ledger rows; most BOEs are in the register, a few rows are invalid."""
+    rng = random.Random(f"ledger-{seed}")
+    start = datetime(2025, 4, 1)
+    for index in range(rows):
+        receipt_no = f"KL{index:08d}"
+        boe_no = str(rng.choice(boes)) if boes and rng.random() < 0.9 else str(rng.randrange(1000000, 9999999))
+        roll = rng.random()
+        if roll < 0.002:
+            receipt_no = None
+        elif roll < 0.004:
+            boe_no = None
+        yield (index + 1, receipt_no, boe_no, start + timedelta(minutes=7 * index),
+               rng.choice(CONSIGNEES), 285)
+
+
+def write_ledger(path, rows, boes, seed=0):
+    _write_table(path, LEDGER_COLUMNS, ledger_records(rows, boes, seed))
+
+
+def _write_table(path, columns, records):
+    if path.endswith(".csv"):
+        import csv
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(records)
+        return
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for record in records:
+        sheet.append(record)
+    workbook.save(path)
+
+
+def write_invoices(invoice_dir, count, boes, seed=0):
+    """Write count invoice PDFs into invoice_dir and return their paths."""
+    os.makedirs(invoice_dir, exist_ok=True)
+    rng = random.Random(f"invoices-{seed}")
+    pdf_paths = []
+    for number in range(count):
+        boe_no = rng.choice(boes) if boes and rng.random() < 0.9 else rng.randrange(1000000, 9999999)
+        path = os.path.join(invoice_dir, f"HASTI_{number:06d}.pdf")
+        write_pdf(path, invoice_pages(number, boe_no, rng))
+        pdf_paths.append(path)
+    return pdf_paths
+
+
+def write_tabular_invoices(invoice_dir, count, boes, seed=0):
+    """Write count invoice PDFs laid out as tabular_invoice_pages and return their paths."""
+    os.makedirs(invoice_dir, exist_ok=True)
+    rng = random.Random(f"tabular-{seed}")
+    pdf_paths = []
+    for number in range(count):
+        boe_no = rng.choice(boes) if boes and rng.random() < 0.9 else rng.randrange(1000000, 9999999)
+        path = os.path.join(invoice_dir, f"HASTI_tabular_{number:06d}.pdf")
+        write_pdf(path, tabular_invoice_pages(number, boe_no, rng))
+        pdf_paths.append(path)
+    return pdf_paths
+
+
+def generate_corpus(out_dir, invoices=10, ledger_rows=1000, register_rows=1000, seed=0):
+    """Write invoices/*.pdf, job_register.xlsx and ledger.xlsx under out_dir.
+
+    Returns a dict of the paths. About 90% of invoice and ledger BOE numbers
+    are in the job register.
+    """
+    boes = register_boes(register_rows, seed)
+    pdf_paths = write_invoices(os.path.join(out_dir, "invoices"), invoices, boes, seed)
+    register_path = os.path.join(out_dir, "job_register.xlsx")
+    write_job_register(register_path, register_rows, seed)
+    ledger_path = os.path.join(out_dir, "ledger.xlsx")
+    write_ledger(ledger_path, ledger_rows, boes, seed)
+    return {"invoices": pdf_paths, "job_register": register_path, "ledger": ledger_path}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic HASTI invoice / Kale ledger corpus.")
+    parser.add_argument("out_dir", help="folder to write the corpus to")
+    parser.add_argument("--invoices", type=int, default=10, help="number of invoice PDFs (default: 10)")
+    parser.add_argument("--ledger-rows", type=int, default=1000, help="rows in ledger.xlsx (default: 1000)")
+    parser.add_argument("--register-rows", type=int, default=1000, help="rows in job_register.xlsx (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    paths = generate_corpus(args.out_dir, args.invoices, args.ledger_rows, args.register_rows, args.seed)
+    print(f"{len(paths['invoices'])} invoices, {paths['job_register']}, {paths['ledger']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Throughput benchmark for the HASTI and Ledger conversion functions.
+
+Generates a synthetic corpus (see synthetic_corpus.py), then times each
+stage on its own, without the GUI:
+
+  hasti.extract_text_from_pdf               per invoice PDF
+  hasti.extract_text_from_pdf_pdfplumber    per invoice PDF, pdfplumber only
+  hasti.extract_invoice_details_with_regex  per extracted text
+  hasti.load_job_register                   per register row
+  hasti.load_job_register_snapshot          per register row, second load
+  hasti.match_job_no_by_be                  per invoice record
+  hasti.create_csv                          per invoice record
+  ledger.load_job_register                  per register row
+  ledger.load_job_register_snapshot         per register row, second load
+  ledger.get_job_number                     per ledger BOE lookup
+  ledger.create_csv                         per ledger row, from a DataFrame
+  ledger.stream_csv                         per ledger row, from a .xlsx workbook
+                                            (the path the GUI and CLI take)
+
+Usage:
+  python benchmarks/throughput_benchmark.py --scale medium --save-baseline baseline.json
+  python benchmarks/throughput_benchmark.py --scale medium --baseline baseline.json
+
+With --baseline, exits with 1 and prints REGRESSION lines if any stage's
+rate dropped by more than --tolerance. Only stages measured at the same
+scale as the baseline are compared; the others are listed as not compared.
+BASELINE (baseline_small.json beside this script) is the reference for
+--scale small, as recorded on the machine named in it. Its stages are
+short enough to vary by about 25% from run to run, so compare against it
+with --tolerance 0.5; rates also depend on the machine, so a CI runner of
+another speed should save its own.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import synthetic_corpus  # noqa: E402
+
+BASELINE = os.path.join(BENCHMARK_DIR, "baseline_small.json")
+
+SCALES = {
+    "small": {"invoices": 10, "ledger_rows": 1000, "register_rows": 1000},
+    "medium": {"invoices": 1000, "ledger_rows": 100000, "register_rows": 20000},
+    "large": {"invoices": 10000, "ledger_rows": 1000000, "register_rows": 100000},
+}
+
+
+def quiet(message):
+    pass
+
+
+def timed(results, name, items, func):
+    started = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - started
+    results[name] = {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "per_sec": round(items / seconds, 1) if seconds > 0 else None,
+    }
+    print(f"{name:<42} {items:>9} items {seconds:>9.3f} s {results[name]['per_sec'] or 0:>12.1f} /s", flush=True)
+    return value
+
+
+def bench_hasti(hasti, work_dir, params, seed, results):
+    boes = synthetic_corpus.register_boes(params["register_rows"], seed)
+    pdf_paths = synthetic_corpus.write_invoices(os.path.join(work_dir, "invoices"), params["invoices"], boes, seed)
+    register_path = os.path.join(work_dir, "hasti_job_register.xlsx")
+    synthetic_corpus.write_job_register(register_path, params["register_rows"], seed)
+
+    extracted = timed(results, "hasti.extract_text_from_pdf", len(pdf_paths),
+                      lambda: [hasti.extract_text_from_pdf(path, quiet) for path in pdf_paths])
+    timed(results, "hasti.extract_text_from_pdf_pdfplumber", len(pdf_paths),
+          lambda: [hasti.extract_text_from_pdf(path, quiet, backends=()) for path in pdf_paths])
+    texts = [(text, tables_data) for text, tables_data in extracted if text]
+    all_details = timed(results, "hasti.extract_invoice_details_with_regex", len(texts),
+                        lambda: [details for text, tables_data in texts
+                                 for details in hasti.extract_invoice_details_with_regex(text, tables_data, quiet)])
+    job_register = timed(results, "hasti.load_job_register", params["register_rows"],
+                         lambda: hasti.load_job_register(register_path, quiet))
+    timed(results, "hasti.load_job_register_snapshot", params["register_rows"],
+          lambda: hasti.load_job_register(register_path, quiet))
+    be_nos = [details.get("BOE No", "") for details in all_details]
+    job_nos = timed(results, "hasti.match_job_no_by_be", len(be_nos),
+                    lambda: [hasti.match_job_no_by_be(job_register, be_no) for be_no in be_nos])
+    for details, job_no in zip(all_details, job_nos):
+        details["Ref No"] = job_no
+    output_csv = os.path.join(work_dir, "hasti_output.csv")
+    timed(results, "hasti.create_csv", len(all_details),
+          lambda: hasti.create_csv(all_details, output_csv, quiet))
+
+
+def bench_ledger(ledger, work_dir, params, seed, results, lookups):
+    import pandas as pd
+    register_path = os.path.join(work_dir, "ledger_job_register.xlsx")
+    synthetic_corpus.write_job_register(register_path, params["register_rows"], seed)
+    boes = synthetic_corpus.register_boes(params["register_rows"], seed)
+    # Built in memory with the types pd.read_excel gives for ledger.xlsx, so
+    # the 1M-row scale does not spend minutes writing and reading a workbook
+    ledger_data = pd.DataFrame.from_records(
+        list(synthetic_corpus.ledger_records(params["ledger_rows"], boes, seed)),
+        columns=synthetic_corpus.LEDGER_COLUMNS,
+    )
+
+    ledger.JOB_REGISTER_PATH = register_path
+    timed(results, "ledger.load_job_register", params["register_rows"],
+          lambda: ledger.JOB_REGISTER.refresh(register_path, quiet))
+    ledger.JOB_REGISTER.path = None
+    timed(results, "ledger.load_job_register_snapshot", params["register_rows"],
+          lambda: ledger.JOB_REGISTER.refresh(register_path, quiet))
+    boe_nos = ledger_data["BOE No."].dropna().tolist()[:lookups]
+    timed(results, "ledger.get_job_number", len(boe_nos),
+          lambda: [ledger.get_job_number(boe_no, quiet) for boe_no in boe_nos])
+    output_csv = os.path.join(work_dir, "ledger_output.csv")
+    timed(results, "ledger.create_csv", len(ledger_data),
+          lambda: ledger.create_csv(ledger_data, output_csv, quiet))
+    # Writing the workbook is not timed; at the large scale it takes minutes
+    ledger_path = os.path.join(work_dir, "ledger.xlsx")
+    synthetic_corpus.write_ledger(ledger_path, params["ledger_rows"], boes, seed)
+    timed(results, "ledger.stream_csv", params["ledger_rows"],
+          lambda: ledger.stream_csv(ledger_path, os.path.join(work_dir, "ledger_stream_output.csv"), quiet))
+
+
+def find_regressions(results, baseline, tolerance, min_seconds):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name}: not compared (not in the baseline)")
+            continue
+        if not base.get("per_sec") or not result["per_sec"]:
+            continue
+        if base["items"] != result["items"]:
+            print(f"{name}: not compared (baseline has {base['items']} items, this run {result['items']})")
+            continue
+        if base["seconds"] < min_seconds:
+            continue
+        if result["per_sec"] < base["per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['per_sec']}/s vs baseline {base['per_sec']}/s "
+                               f"({result['per_sec'] / base['per_sec'] - 1:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the HASTI and Ledger conversion stages on a synthetic corpus.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="corpus size preset (default: small)")
+    parser.add_argument("--invoices", type=int, help="override the number of invoice PDFs")
+    parser.add_argument("--ledger-rows", type=int, help="override the number of ledger rows")
+    parser.add_argument("--register-rows", type=int, help="override the number of job register rows")
+    parser.add_argument("--lookups", type=int, default=100000,
+                        help="ledger BOEs passed to get_job_number (default: 100000)")
+    parser.add_argument("--only", choices=["hasti", "ledger"], help="run one converter's stages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="keep the corpus and outputs here instead of a temporary folder")
+    parser.add_argument("--json", metavar="PATH", help="write the results to this JSON file")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare against results saved with --save-baseline "
+                             f"(the committed one for --scale small: {os.path.relpath(BASELINE, REPO_DIR)})")
+    parser.add_argument("--save-baseline", metavar="PATH", help="save these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed drop in rate against the baseline as a fraction (default: 0.2)")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="do not compare stages whose baseline took less than this (default: 0.05)")
+    args = parser.parse_args(argv)
+
+    params = dict(SCALES[args.scale])
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="converter_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    # Configured before the converters are imported, so their
+    # log_pipeline.setup_logging() leaves it alone and log output (still
+    # produced, as in real runs) goes here
+    logging.basicConfig(
+        handlers=[logging.FileHandler(os.path.join(work_dir, "benchmark.log"))],
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    import HASTI_Invoice_to_CSV as hasti
+    import Ledger_to_CSV as ledger
+    # Synthetic layouts and cache entries stay in the work folder, out of the user's HASTI_Cache
+    os.environ[hasti.CACHE_DIR_ENV] = os.path.join(work_dir, "HASTI_Cache")
+    # The converters import these on first use; that is startup cost (see
+    # startup_benchmark.py), so it is kept out of the first stage's time
+    import openpyxl  # noqa: F401
+    import pandas  # noqa: F401
+    import pdfplumber  # noqa: F401
+
+    print(f"Scale: {params} (work dir {work_dir})")
+    results = {}
+    try:
+        if args.only in (None, "hasti"):
+            bench_hasti(hasti, work_dir, params, args.seed, results)
+        if args.only in (None, "ledger"):
+            bench_ledger(ledger, work_dir, params, args.seed, results, args.lookups)
+    finally:
+        logging.shutdown()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": params,
+        "results": results,
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance, args.min_seconds)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
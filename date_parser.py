@@ -0,0 +1,68 @@
+"""Date parsing over a list of strptime formats, memoised and format-learning.
+
+A batch of invoices or ledger rows nearly always writes its dates one way,
+and the same few dates repeat. DateParser therefore:
+
+- tries first the format that last succeeded for the same source (e.g.
+  "Vendor Inv Date"), so a typical value costs one strptime, not one per
+  format plus a ValueError each;
+- keeps an LRU memo of (value, output format) -> result, so a repeated
+  date is parsed once;
+- formats a whole column with format_many(), once per distinct value.
+
+The formats must not overlap (no string parses under two of them), so the
+order they are tried in never changes the result.
+"""
+from datetime import datetime
+from functools import lru_cache
+
+
+class DateParser:
+    def __init__(self, formats, not_found="Not Found", maxsize=4096):
+        self.formats = tuple(formats)
+        self.not_found = not_found
+        self.last_format = {}   # source -> index into formats of the last success
+        self._format_cached = lru_cache(maxsize=maxsize)(self._format_uncached)
+
+    def parse(self, date_str, source=None):
+        """The datetime for date_str, or None if no format matches."""
+        first = self.last_format.get(source, 0)
+        if first:
+            order = (first,) + tuple(i for i in range(len(self.formats)) if i != first)
+        else:
+            order = range(len(self.formats))
+        for index in order:
+            try:
+                parsed = datetime.strptime(date_str, self.formats[index])
+            except ValueError:
+                continue
+            self.last_format[source] = index
+            return parsed
+        return None
+
+    def format(self, date_str, out_fmt, source=None):
+        """date_str rewritten as out_fmt, or not_found if no format matches."""
+        return self._format_cached(date_str, out_fmt, source)
+
+    def format_many(self, values, out_fmt, source=None):
+        """format() for a column of strings or datetimes, parsing each distinct value once."""
+        # Not left to the LRU alone: a column can hold more distinct dates than it keeps
+        results = {}
+        formatted = []
+        for value in values:
+            if value not in results:
+                if isinstance(value, datetime):
+                    results[value] = value.strftime(out_fmt)
+                elif isinstance(value, str):
+                    results[value] = self.format(value, out_fmt, source)
+                else:
+                    results[value] = self.not_found
+            formatted.append(results[value])
+        return formatted
+
+    def cache_info(self):
+        return self._format_cached.cache_info()
+
+    def _format_uncached(self, date_str, out_fmt, source):
+        parsed = self.parse(date_str, source)
+        return parsed.strftime(out_fmt) if parsed is not None else self.not_found
@@ -0,0 +1,87 @@
+"""On-disk index of the record keys already written to an output CSV."""
+import os
+import sqlite3
+import time
+
+# Keys per SELECT ... IN (...) query; below SQLite's bound-parameter limit
+_QUERY_BATCH = 500
+
+
+class ExportIndex:
+    """SQLite set of exported record keys, so append runs skip what was exported before.
+
+    Keys are looked up through the table's primary key. The CSV rows are
+    written before their keys are added, so a run that dies in between
+    exports those rows again next time rather than losing them.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        # The GUI, a watch and a command-line run may share one output folder
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS exported ("
+            " key TEXT PRIMARY KEY,"
+            " output TEXT NOT NULL,"
+            " exported_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM exported WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM exported").fetchone()[0]
+
+    def exported(self, keys):
+        """The subset of keys already in the index."""
+        keys = list(dict.fromkeys(keys))
+        found = set()
+        for start in range(0, len(keys), _QUERY_BATCH):
+            batch = keys[start:start + _QUERY_BATCH]
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT key FROM exported WHERE key IN ({','.join('?' * len(batch))})", batch
+            ))
+        return found
+
+    def add(self, keys, output):
+        """Record keys as exported to `output` (a file name, for reference)."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO exported (key, output, exported_at) VALUES (?, ?, ?)",
+            ((key, output, now) for key in keys),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def split_new(records, key_of, index):
+    """Split records into those to write and the number skipped as already exported.
+
+    Returns (new_records, new_keys, skipped). A record whose key_of() is None
+    (its key fields are missing) is always written and not indexed; of two
+    records with the same key in one batch, only the first is written.
+    """
+    keys = [key_of(record) for record in records]
+    seen = index.exported(key for key in keys if key is not None)
+    new_records = []
+    new_keys = []
+    for record, key in zip(records, keys):
+        if key is None:
+            new_records.append(record)
+            continue
+        if key in seen:
+            continue
+        seen.add(key)
+        new_records.append(record)
+        new_keys.append(key)
+    return new_records, new_keys, len(records) - len(new_records)
@@ -0,0 +1,91 @@
+"""On-disk cache of invoice PDF extraction results, keyed by file content."""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+# Default size limit for the cache file contents (compressed payloads)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's bytes."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ExtractionCache:
+    """SQLite store of (text, tables_data, details) per PDF digest and parser version.
+
+    Payloads are zlib-compressed JSON. Once the stored payloads exceed
+    max_bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path, parser_version, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.parser_version = str(parser_version)
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " digest TEXT NOT NULL,"
+            " parser_version TEXT NOT NULL,"
+            " payload BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (digest, parser_version))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions (last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+
+    def get(self, digest):
+        """Return {"text", "tables_data", "details"} for a digest, or None on a miss."""
+        row = self.conn.execute(
+            "SELECT payload FROM extractions WHERE digest = ? AND parser_version = ?",
+            (digest, self.parser_version),
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(
+            "UPDATE extractions SET last_used = ? WHERE digest = ? AND parser_version = ?",
+            (time.time(), digest, self.parser_version),
+        )
+        self.conn.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, digest, text, tables_data, details):
+        payload = zlib.compress(json.dumps({"text": text, "tables_data": tables_data, "details": details}).encode("utf-8"))
+        old = self.conn.execute(
+            "SELECT size FROM extractions WHERE digest = ? AND parser_version = ?",
+            (digest, self.parser_version),
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO extractions (digest, parser_version, payload, size, last_used) VALUES (?, ?, ?, ?, ?)",
+            (digest, self.parser_version, payload, len(payload), time.time()),
+        )
+        self.total_bytes += len(payload) - (old[0] if old else 0)
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            row = self.conn.execute(
+                "SELECT digest, parser_version, size FROM extractions ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self.total_bytes = 0
+                break
+            self.conn.execute("DELETE FROM extractions WHERE digest = ? AND parser_version = ?", row[:2])
+            self.total_bytes -= row[2]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
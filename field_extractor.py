@@ -0,0 +1,84 @@
+"""Declarative, single-pass extraction of labelled fields from invoice text."""
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, NamedTuple
+
+
+def first_group(match):
+    return match.group(1)
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """One field: the label it starts with, the full pattern, and how to read it.
+
+    Every match of `pattern` must begin with the literal `anchor`. `post`
+    turns the match object into the field value; `default` is used when the
+    field is not found.
+    """
+    name: str
+    anchor: str
+    pattern: str
+    flags: int = 0
+    post: Callable[[re.Match], Any] = first_group
+    default: Any = "Not Found"
+
+
+class FieldMatch(NamedTuple):
+    value: Any
+    start: int
+    end: int
+
+
+class FieldExtractor:
+    """Finds the first match of each FieldSpec in one left-to-right pass.
+
+    All patterns are compiled once. A single scanner regex looks for the
+    fields' anchor labels; a field's full pattern is only tried where its
+    anchor occurs, and the scan stops as soon as every requested field has
+    matched. Results are the same as a separate re.search per field.
+    """
+
+    def __init__(self, specs):
+        self.specs = list(specs)
+        self.patterns = [re.compile(spec.pattern, spec.flags) for spec in self.specs]
+        self.by_first_char = {}
+        anchors = []
+        for index, spec in enumerate(self.specs):
+            first = spec.anchor[0]
+            chars = {first.lower(), first.upper()} if spec.flags & re.IGNORECASE else {first}
+            for char in chars:
+                self.by_first_char.setdefault(char, []).append(index)
+            rest = re.escape(spec.anchor[1:])
+            anchors.append(f"(?i:{rest})" if spec.flags & re.IGNORECASE else rest)
+        # A leading character class lets the regex engine jump straight to
+        # candidate positions; the rest of each anchor is a lookahead, so the
+        # scanner only consumes one character and overlapping anchors are all
+        # seen. A hit on the wrong first character is harmless: the full
+        # pattern is checked before anything is recorded.
+        first_chars = "".join(re.escape(char) for char in sorted(self.by_first_char))
+        self.scanner = re.compile(f"[{first_chars}](?=(?:{'|'.join(anchors)}))")
+
+    def extract(self, text, names=None):
+        """Return {name: FieldMatch} for the fields (default: all) found in text."""
+        pending = {index for index, spec in enumerate(self.specs) if names is None or spec.name in names}
+        found = {}
+        if not pending:
+            return found
+        for hit in self.scanner.finditer(text):
+            pos = hit.start()
+            for index in self.by_first_char.get(text[pos], ()):
+                if index not in pending:
+                    continue
+                match = self.patterns[index].match(text, pos)
+                if match:
+                    spec = self.specs[index]
+                    found[spec.name] = FieldMatch(spec.post(match), match.start(), match.end())
+                    pending.discard(index)
+            if not pending:
+                break
+        return found
+
+    def values(self, found):
+        """Field values by name, with each spec's default for missing fields."""
+        return {spec.name: found[spec.name].value if spec.name in found else spec.default for spec in self.specs}
@@ -0,0 +1,60 @@
+"""Splitting a consolidated PDF, page by page, into the invoices it holds."""
+from typing import NamedTuple
+
+
+class InvoiceSegment(NamedTuple):
+    first_page: int   # 0-based page indexes, inclusive
+    last_page: int
+    text: str
+
+
+class InvoiceSegmenter:
+    """Groups a stream of page texts into invoices.
+
+    A page whose `boundary` field (matched with `extractor`, a
+    FieldExtractor) has a value other than the current invoice's starts
+    the next invoice; pages without it, or repeating the same value, are
+    continuation pages. Pages before the first match belong to the first
+    invoice. Invoices are assumed to start on a new page, as they do when
+    invoice PDFs are merged into one file.
+
+    feed() returns the invoice that the page completes, if any, and
+    finish() the last one, so only the current invoice's pages are held.
+    """
+
+    def __init__(self, extractor, boundary):
+        self.extractor = extractor
+        self.boundary = boundary
+        self.count = 0
+        self._value = None
+        self._first_page = None
+        self._last_page = None
+        self._texts = []
+
+    def feed(self, page_index, page_text):
+        found = self.extractor.extract(page_text, [self.boundary]).get(self.boundary)
+        completed = None
+        if found is not None and self._value is not None and found.value != self._value:
+            completed = self._flush()
+        if found is not None:
+            self._value = found.value
+        if self._first_page is None:
+            self._first_page = page_index
+        self._last_page = page_index
+        if page_text:
+            self._texts.append(page_text)
+        return completed
+
+    def finish(self):
+        if self._first_page is None:
+            return None
+        return self._flush()
+
+    def _flush(self):
+        segment = InvoiceSegment(self._first_page, self._last_page, "".join(self._texts))
+        self.count += 1
+        self._value = None
+        self._first_page = None
+        self._last_page = None
+        self._texts = []
+        return segment
@@ -0,0 +1,127 @@
+"""Logging for the converters, off the processing path.
+
+Code calling logger.info() only puts the record on a queue (QueueHandler);
+a QueueListener thread formats it and writes it to the rotating log file
+and to any GUI sink added with add_sink(). Pool processes send their
+records back to the same listener through a multiprocessing queue (see
+worker_initializer()).
+
+The level comes from CONVERTER_LOG_LEVEL (e.g. DEBUG) or the command-line
+--verbose flag. Raw extracted text and other bulky dumps are only produced
+when verbose() is true, i.e. at DEBUG.
+"""
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVEL_ENV = "CONVERTER_LOG_LEVEL"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+_pipeline = None
+
+
+class LogPipeline:
+    def __init__(self, log_path):
+        self.queue = queue.SimpleQueue()
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.listener = logging.handlers.QueueListener(self.queue, file_handler, respect_handler_level=True)
+        self.worker_queue = None
+        self.worker_listener = None
+        self.running = False
+
+    def start(self):
+        self.listener.start()
+        self.running = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        # Writes out the records still queued; safe to call more than once
+        if self.worker_listener is not None:
+            self.worker_listener.stop()
+            self.worker_listener = None
+        if self.running:
+            self.listener.stop()
+            self.running = False
+
+
+def setup_logging(log_path, level=None):
+    """Send root-logger records through the queue to a rotating log_path.
+
+    Like logging.basicConfig, does nothing if the root logger already has
+    handlers (e.g. set up by a benchmark), and nothing in pool processes,
+    which are set up by worker_initializer().
+    """
+    global _pipeline
+    root = logging.getLogger()
+    if root.handlers or multiprocessing.parent_process() is not None:
+        return root
+    root.setLevel(parse_level(os.environ.get(LOG_LEVEL_ENV) if level is None else level))
+    _pipeline = LogPipeline(log_path)
+    root.addHandler(logging.handlers.QueueHandler(_pipeline.queue))
+    _pipeline.start()
+    return root
+
+
+def parse_level(level, default=logging.INFO):
+    """A level number from a number or a name such as "debug"; default if unknown."""
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper()) if level else default
+    return value if isinstance(value, int) else default
+
+
+def set_level(level):
+    logging.getLogger().setLevel(parse_level(level))
+
+
+def verbose():
+    """True when raw text and DEBUG detail dumps should be logged."""
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
+def add_sink(handler):
+    """Add a handler (e.g. the GUI log panel) that is fed by the listener thread."""
+    if _pipeline is None:
+        logging.getLogger().addHandler(handler)
+        return
+    _pipeline.listener.handlers = _pipeline.listener.handlers + (handler,)
+
+
+def remove_sink(handler):
+    if _pipeline is None:
+        logging.getLogger().removeHandler(handler)
+        return
+    _pipeline.listener.handlers = tuple(h for h in _pipeline.listener.handlers if h is not handler)
+
+
+def worker_initializer():
+    """(initializer, initargs) for a ProcessPoolExecutor so its workers log through the pipeline."""
+    level = logging.getLogger().level
+    if _pipeline is None:
+        return _init_worker, (None, level)
+    if _pipeline.worker_queue is None:
+        _pipeline.worker_queue = multiprocessing.Queue()
+        # Re-queues worker records on the main queue, so they reach every sink
+        _pipeline.worker_listener = logging.handlers.QueueListener(
+            _pipeline.worker_queue, logging.handlers.QueueHandler(_pipeline.queue)
+        )
+        _pipeline.worker_listener.start()
+    return _init_worker, (_pipeline.worker_queue, level)
+
+
+def _init_worker(log_queue, level):
+    root = logging.getLogger()
+    # A forked worker inherits the parent's handlers; its queue is not shared
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    if log_queue is not None:
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
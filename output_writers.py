@@ -0,0 +1,181 @@
+"""Extra output files written from the same rows as the Logisys CSV.
+
+The CSV the converters always write stays the one Logisys imports. Each
+extra format named with --format gets a file beside it (Hasti_<...>.csv.gz,
+.csv.zst, .parquet or .xlsx), fed the same rows as they are written, so
+none of them holds the whole run in memory:
+
+- csv.gz / csv.zst: the same CSV, compressed. Both can be appended to (a
+  gzip or zstd file may hold several compressed members one after another).
+- parquet: string columns with dictionary encoding, which stores a column
+  that holds one value on every row (most Logisys columns) in a few bytes
+  per row group. Needs pyarrow.
+- xlsx: a write-only openpyxl workbook, streamed to disk, for reviewers.
+
+zstandard and pyarrow are optional: a format whose package is missing is
+reported by check_formats() before any work starts.
+"""
+import csv
+import gzip
+import importlib.util
+import io
+import os
+
+OUTPUT_FORMATS = ("csv.gz", "csv.zst", "parquet", "xlsx")
+
+# Formats a later run can add rows to (--append, watch mode)
+APPENDABLE_FORMATS = ("csv.gz", "csv.zst")
+
+# Package each format needs beyond the converters' own requirements
+FORMAT_PACKAGES = {"csv.zst": "zstandard", "parquet": "pyarrow", "xlsx": "openpyxl"}
+
+# Rows buffered per Parquet row group
+PARQUET_ROW_GROUP_ROWS = 50000
+
+
+def output_path_for(csv_path, fmt):
+    """The extra output beside csv_path: report.csv -> report.csv.gz, report.parquet, ..."""
+    stem = csv_path[:-4] if csv_path.lower().endswith(".csv") else csv_path
+    return f"{stem}.{fmt}"
+
+
+def check_formats(formats, append=False):
+    """An error message if a format is unknown, cannot be appended to or lacks its package; else None."""
+    for fmt in formats:
+        if fmt not in OUTPUT_FORMATS:
+            return f"unknown output format {fmt!r} (choose from {', '.join(OUTPUT_FORMATS)})"
+        if append and fmt not in APPENDABLE_FORMATS:
+            return f"{fmt} output cannot be appended to; with --append use {' or '.join(APPENDABLE_FORMATS)}"
+        package = FORMAT_PACKAGES.get(fmt)
+        if package and importlib.util.find_spec(package) is None:
+            return f"{fmt} output needs the {package} package (pip install {package})"
+    return None
+
+
+class _CSVStreamWriter:
+    def __init__(self, path, columns, append, write_header, fmt, lineterminator):
+        mode = "ab" if append else "wb"
+        if fmt == "csv.gz":
+            self._raw = gzip.open(path, mode)
+            self._closers = [self._raw]
+        else:
+            import zstandard
+            self._file = open(path, mode)
+            self._raw = zstandard.ZstdCompressor().stream_writer(self._file)
+            self._closers = [self._raw, self._file]
+        self._text = io.TextIOWrapper(self._raw, encoding="utf-8", newline="", write_through=True)
+        self._writer = csv.writer(self._text, lineterminator=lineterminator)
+        if write_header:
+            self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        # Detached rather than closed, so the compressor is closed once, below
+        self._text.flush()
+        self._text.detach()
+        for closer in self._closers:
+            closer.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.columns = list(columns)
+        self._schema = pa.schema([(name, pa.string()) for name in self.columns])
+        self._writer = pq.ParquetWriter(path, self._schema, use_dictionary=True, compression="zstd")
+        self._rows = []
+
+    def write(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= PARQUET_ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        columns = list(zip(*self._rows))
+        self._writer.write_table(self._pa.table(
+            [self._pa.array(["" if value is None else str(value) for value in column], type=self._pa.string())
+             for column in columns],
+            schema=self._schema,
+        ))
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+class _XLSXWriter:
+    def __init__(self, path, columns):
+        from openpyxl import Workbook
+        self.path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Purchase")
+        self._sheet.append(list(columns))
+
+    def write(self, rows):
+        for row in rows:
+            self._sheet.append(["" if value is None else value for value in row])
+
+    def close(self):
+        self._workbook.save(self.path)
+
+
+class ExtraOutputs:
+    """The extra output files of one run, written row batch by row batch.
+
+    write(rows) takes lists of values in `columns` order. Files are
+    created on the first write(), so a run with no records leaves none.
+    With append=True the header goes only into files that are new.
+    lineterminator should match the plain CSV's, so a compressed copy
+    decompresses to the same bytes.
+    """
+
+    def __init__(self, csv_path, formats, columns, append=False, lineterminator="\r\n"):
+        self.paths = {fmt: output_path_for(csv_path, fmt) for fmt in dict.fromkeys(formats)}
+        self.columns = list(columns)
+        self.append = append
+        self.lineterminator = lineterminator
+        self.opened = False
+        self._writers = []
+
+    def __bool__(self):
+        return bool(self.paths)
+
+    def _open(self):
+        self.opened = True
+        for fmt, path in self.paths.items():
+            if fmt in APPENDABLE_FORMATS:
+                write_header = not self.append or not os.path.isfile(path) or os.path.getsize(path) == 0
+                self._writers.append(_CSVStreamWriter(path, self.columns, self.append, write_header, fmt,
+                                                      self.lineterminator))
+            elif fmt == "parquet":
+                self._writers.append(_ParquetWriter(path, self.columns))
+            else:
+                self._writers.append(_XLSXWriter(path, self.columns))
+
+    def write(self, rows):
+        if not self.paths or not rows:
+            return
+        if not self.opened:
+            self._open()
+        for writer in self._writers:
+            writer.write(rows)
+
+    def close(self):
+        writers, self._writers = self._writers, []
+        for writer in writers:
+            writer.close()
+
+    def discard(self):
+        """Close and delete the files, unless they were appended to."""
+        self.close()
+        if self.opened and not self.append:
+            for path in self.paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,145 @@
+"""Field regions of known invoice layouts, so a PDF in a known layout is read from a few crops.
+
+When a PDF has been read in full and every required field was found on its
+first or last page, learn_template() records where: the bounding box of
+each field's line, the page size and the text above the first field (the
+letterhead). A later PDF whose first page has the same size and letterhead
+is read from crops only: the first page from the first field down, and the
+last page from its top down to its last field's line. The pages in between
+(container lists on long invoices) are left to the caller, which reads
+their plain text without layout analysis, so a service line or flag on
+them is still seen. The caller also checks the cropped text for every
+required field and reads the whole PDF if one is missing, so a template
+that no longer fits costs one extra pass, never a wrong value from a
+missing field.
+
+Templates are kept as JSON next to the extraction cache, newest first.
+"""
+import json
+import os
+import tempfile
+
+TEMPLATE_FORMAT = 1
+
+# Templates kept; the oldest learned are dropped
+MAX_TEMPLATES = 20
+
+# Points added around each field's line, and tolerance when comparing page sizes
+REGION_PAD = 3.0
+SIZE_TOLERANCE = 1.0
+
+
+def _page_text(page, top, bottom):
+    top = max(0.0, top)
+    bottom = min(float(page.height), bottom)
+    if bottom <= top:
+        return ""
+    return page.crop((0, top, page.width, bottom)).extract_text() or ""
+
+
+def learn_template(pages, field_hits):
+    """A template from field_hits, {field: (page index, matched text)}, or None if the layout is not fixed.
+
+    Every hit must be on the first or the last page, where it is located
+    with pdfplumber's page.search().
+    """
+    last = len(pages) - 1
+    boxes = []
+    for field, (page_index, matched) in field_hits.items():
+        if page_index not in (0, last):
+            return None
+        hits = pages[page_index].search(matched, regex=False)
+        if not hits:
+            return None
+        boxes.append({
+            "field": field,
+            "page": 0 if page_index == 0 else -1,
+            "top": hits[0]["top"],
+            "bottom": hits[0]["bottom"],
+        })
+    first_top = min((box["top"] for box in boxes if box["page"] == 0), default=None)
+    if first_top is None:
+        return None
+    first_page = pages[0]
+    return {
+        "width": float(first_page.width),
+        "height": float(first_page.height),
+        "letterhead": _page_text(first_page, 0, first_top - REGION_PAD),
+        "boxes": boxes,
+    }
+
+
+def matches(template, first_page):
+    """True if first_page has the template's size and letterhead."""
+    if (abs(float(first_page.width) - template["width"]) > SIZE_TOLERANCE
+            or abs(float(first_page.height) - template["height"]) > SIZE_TOLERANCE):
+        return False
+    first_top = min(box["top"] for box in template["boxes"] if box["page"] == 0)
+    return _page_text(first_page, 0, first_top - REGION_PAD) == template["letterhead"]
+
+
+def cropped_text(template, pages):
+    """The text of the template's regions: [first page] or [first page, last page]."""
+    first_boxes = [box for box in template["boxes"] if box["page"] == 0]
+    last_boxes = [box for box in template["boxes"] if box["page"] == -1]
+    # The first page from its first field down, so the service lines below the header are read too
+    texts = [_page_text(pages[0], min(box["top"] for box in first_boxes) - REGION_PAD, float(pages[0].height))]
+    if last_boxes and len(pages) > 1:
+        # From the top, as service lines may run on above the totals
+        texts.append(_page_text(pages[-1], 0, max(box["bottom"] for box in last_boxes) + REGION_PAD))
+    return texts
+
+
+class TemplateStore:
+    """The learned templates, saved as JSON at `path` for parser `version`."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = str(version)
+        self.templates = []
+        try:
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("format") == TEMPLATE_FORMAT and saved.get("version") == self.version:
+                self.templates = list(saved.get("templates", []))
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def __len__(self):
+        return len(self.templates)
+
+    def find(self, first_page):
+        for template in self.templates:
+            if matches(template, first_page):
+                return template
+        return None
+
+    def add(self, template):
+        """Keep template as the newest (replacing one for the same layout) and save."""
+        self.templates = [
+            known for known in self.templates
+            if (known["width"], known["height"], known["letterhead"])
+            != (template["width"], template["height"], template["letterhead"])
+        ]
+        self.templates.insert(0, template)
+        del self.templates[MAX_TEMPLATES:]
+        self._save()
+
+    def _save(self):
+        # Written to a temporary file and renamed, as pool workers may save at the same time
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"format": TEMPLATE_FORMAT, "version": self.version, "templates": self.templates}, f)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
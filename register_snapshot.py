@@ -0,0 +1,94 @@
+"""Snapshots of parsed job registers, so a large workbook is only parsed once.
+
+The parsed register (whatever JSON-compatible structure the converter
+builds from it) is saved as zlib-compressed JSON next to the workbook, as
+<register>.<kind>.snapshot, with the workbook's size, mtime and SHA-256.
+A later load uses the snapshot if the size and mtime still match; if they
+changed but the content hash did not (the file was copied or touched), the
+snapshot is kept and its recorded mtime updated. Otherwise the caller
+re-parses the workbook and saves a new snapshot.
+
+JSON rather than pickle: the snapshot lives beside the register, often on a
+shared folder, and unpickling a planted file would run code.
+"""
+import json
+import os
+import tempfile
+import zlib
+
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_path(source_path, kind):
+    return f"{source_path}.{kind}.snapshot"
+
+
+def _source_stat(source_path):
+    stat = os.stat(source_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_snapshot(source_path, kind, version):
+    """The data saved for source_path, or None if there is no current snapshot."""
+    path = snapshot_path(source_path, kind)
+    try:
+        with open(path, "rb") as f:
+            snapshot = json.loads(zlib.decompress(f.read()))
+        size, mtime_ns = _source_stat(source_path)
+    except (OSError, ValueError, zlib.error):
+        return None
+    if (not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT
+            or snapshot.get("version") != str(version) or snapshot.get("size") != size):
+        return None
+    if snapshot.get("mtime_ns") != mtime_ns:
+        from extraction_cache import file_digest
+        try:
+            if file_digest(source_path) != snapshot.get("sha256"):
+                return None
+        except OSError:
+            return None
+        # Same bytes, new mtime: keep the snapshot, and skip the hash next time
+        snapshot["mtime_ns"] = mtime_ns
+        _write_snapshot(path, snapshot)
+    return snapshot.get("data")
+
+
+def save_snapshot(source_path, kind, version, data):
+    """Save data as the snapshot of source_path. Returns False if it could not be written."""
+    from extraction_cache import file_digest
+    try:
+        size, mtime_ns = _source_stat(source_path)
+        snapshot = {
+            "format": SNAPSHOT_FORMAT,
+            "version": str(version),
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": file_digest(source_path),
+            "data": data,
+        }
+        return _write_snapshot(snapshot_path(source_path, kind), snapshot)
+    except (OSError, TypeError, ValueError):
+        return False
+
+
+def _write_snapshot(path, snapshot):
+    # Written to a temporary file and renamed, so a reader (or another
+    # process saving the same snapshot) never sees half a file
+    try:
+        payload = zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    except (OSError, TypeError, ValueError):
+        return False
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        # mkstemp creates the file private; other users of the folder read it too
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
@@ -0,0 +1,100 @@
+"""Journal of the files a batch run has finished, so a restarted run resumes where it stopped."""
+import hashlib
+import json
+import os
+from datetime import datetime
+
+
+def journal_path(journal_dir, inputs):
+    """The journal for a batch over `inputs` (the same files in any order share one)."""
+    names = sorted(os.path.abspath(path) for path in inputs)
+    key = hashlib.sha256("\n".join(names).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(journal_dir, f"run_{key}.jsonl")
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class RunJournal:
+    """Append-only JSON-lines record of the files a batch has finished, with their records.
+
+    The first line names the run's inputs and parser version; each later
+    line is one finished file (path, size, mtime and the records extracted
+    from it), written and fsynced in one go. After a crash every complete
+    line is a file that need not be parsed again; a line cut short is
+    ignored. A journal left by other inputs or another parser version is
+    started afresh, and a file changed since it was journalled is parsed
+    again. resume=False discards an existing journal. finish() deletes the
+    journal once the run is complete.
+    """
+
+    def __init__(self, path, inputs, version, resume=True):
+        self.path = path
+        self.header = {
+            "inputs": sorted(os.path.abspath(p) for p in inputs),
+            "version": str(version),
+        }
+        self.done = {}   # abspath -> (size, mtime_ns, records)
+        self._needs_newline = False
+        if not (resume and self._load()):
+            self.done = {}
+            self._write({**self.header, "started_at": datetime.now().isoformat(timespec="seconds")}, mode="w")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if {key: header.get(key) for key in self.header} != self.header:
+                    return False
+                for line in f:
+                    self._needs_newline = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                        self.done[entry["path"]] = (entry["size"], entry["mtime_ns"], entry["records"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except (OSError, ValueError, AttributeError):
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.done)
+
+    def completed(self, path):
+        """The records journalled for path, or None if it is not done (or has changed since)."""
+        entry = self.done.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        try:
+            if _signature(path) != entry[:2]:
+                return None
+        except OSError:
+            return None
+        return entry[2]
+
+    def add(self, path, records):
+        path = os.path.abspath(path)
+        try:
+            size, mtime_ns = _signature(path)
+        except OSError:
+            return  # gone since it was read; it is parsed again on resume
+        self._write({"path": path, "size": size, "mtime_ns": mtime_ns, "records": records})
+        self.done[path] = (size, mtime_ns, records)
+
+    def finish(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _write(self, entry, mode="a"):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, mode, encoding="utf-8") as f:
+            if self._needs_newline and mode == "a":
+                f.write("\n")
+            self._needs_newline = False
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
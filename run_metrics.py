@@ -0,0 +1,295 @@
+"""Process metrics shared by the HASTI and Ledger converters."""
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def peak_rss_bytes():
+    """Peak resident set size of the current process in bytes, or None if unknown."""
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+            if ctypes.windll.psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+        except Exception:
+            pass
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_bytes(num_bytes):
+    if num_bytes is None:
+        return "n/a"
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def format_progress(done, total, elapsed, unit="files"):
+    """Progress line such as '12/500 files | 3.4 files/sec | ETA 2m 23s'."""
+    rate = done / elapsed if elapsed > 0 else 0.0
+    text = f"{done}/{total} {unit}" if total else f"{done} {unit}"
+    text += f" | {rate:.1f} {unit}/sec"
+    if total and rate > 0 and done < total:
+        text += f" | ETA {format_duration((total - done) / rate)}"
+    return text
+
+
+# Set by benchmarks/startup_benchmark.py to a file path: the GUI writes the
+# time.time() at which its window came up there, then closes
+STARTUP_PROBE_ENV = "CONVERTER_STARTUP_PROBE"
+
+
+def schedule_startup_probe(root):
+    """Arrange for a benchmarked GUI to report its first-window time and exit."""
+    probe_path = os.environ.get(STARTUP_PROBE_ENV)
+    if not probe_path:
+        return
+
+    def report():
+        with open(probe_path, "w") as f:
+            f.write(repr(time.time()))
+        root.destroy()
+
+    # Idle callbacks run once the pending drawing and startup work are done
+    root.after_idle(report)
+
+
+class StageTimer:
+    """Seconds and call counts per named stage, plus named counts (pages, bytes...).
+
+    Time a stage with `with timer("regex"): ...`. Peaks (e.g. "rss_bytes")
+    keep the largest value reported rather than a sum. Timers are plain
+    data, so they can be returned from worker processes and merged.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.counts = {}
+        self.peaks = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage, seconds, calls=1):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def peak(self, name, value):
+        if value is not None and value > self.peaks.get(name, 0):
+            self.peaks[name] = value
+
+    def merge(self, other):
+        for stage, seconds in other.seconds.items():
+            self.add(stage, seconds, other.calls.get(stage, 1))
+        for name, amount in other.counts.items():
+            self.count(name, amount)
+        for name, value in other.peaks.items():
+            self.peak(name, value)
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+
+class RunMetrics(StageTimer):
+    """Stage timings for a whole run, with a per-file breakdown.
+
+    `with metrics("csv_write"): ...` times a run-level stage;
+    `metrics("job_lookup", file=path)` also charges it to that file.
+    summary() is the JSON run summary; write_prometheus() writes the same
+    figures in the Prometheus textfile format. max_files keeps only the
+    most recent files in the summary (for long-running watches).
+    """
+
+    def __init__(self, app, max_files=None):
+        super().__init__()
+        self.app = app
+        self.max_files = max_files
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.outcome = None
+        self.files = OrderedDict()
+        self.file_count = 0
+
+    @contextmanager
+    def __call__(self, stage, file=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.add(stage, seconds)
+            if file is not None and file in self.files:
+                entry = self.files[file]
+                entry["stages"][stage] = entry["stages"].get(stage, 0.0) + seconds
+
+    def add_file(self, path, timer=None, source="parsed", **fields):
+        """Record one input file; its timer's stages and counts join the run totals."""
+        entry = {"file": os.path.basename(path), "source": source, "stages": {}}
+        if timer is not None:
+            self.merge(timer)
+            entry["stages"] = dict(timer.seconds)
+            entry.update(timer.counts)
+            entry.update((f"peak_{name}", value) for name, value in timer.peaks.items())
+        entry.update(fields)
+        self.files[path] = entry
+        self.file_count += 1
+        if self.max_files is not None:
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+        return entry
+
+    def absorb(self, other):
+        """Add another RunMetrics (e.g. from a worker process) to this run."""
+        self.merge(other)
+        for path, entry in other.files.items():
+            self.files[path] = entry
+        self.file_count += other.file_count
+        if self.max_files is not None:
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+
+    def update_file(self, path, **fields):
+        if path in self.files:
+            self.files[path].update(fields)
+
+    def finish(self, outcome):
+        self.outcome = outcome
+        self.finished = time.perf_counter()
+
+    @property
+    def duration(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        duration = self.duration
+        totals = {"files": self.file_count, **self.counts}
+        throughput = {f"{name}_per_sec": round(value / duration, 2) if duration > 0 else None
+                      for name, value in totals.items()}
+        files = []
+        for entry in self.files.values():
+            entry = dict(entry, stages={stage: round(seconds, 4) for stage, seconds in entry["stages"].items()})
+            entry["seconds"] = round(sum(entry["stages"].values()), 4)
+            files.append(entry)
+        return {
+            "app": self.app,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "outcome": self.outcome,
+            "duration_seconds": round(duration, 3),
+            "stages": {
+                stage: {"seconds": round(seconds, 4), "calls": self.calls.get(stage, 0)}
+                for stage, seconds in sorted(self.seconds.items(), key=lambda item: -item[1])
+            },
+            "totals": totals,
+            "throughput": throughput,
+            "peak_rss_bytes": self.peak_rss(),
+            "files": files,
+        }
+
+    def peak_rss(self):
+        """Peak RSS of this process or, if higher, of any worker that reported one."""
+        peaks = [value for value in (peak_rss_bytes(), self.peaks.get("rss_bytes")) if value is not None]
+        return max(peaks) if peaks else None
+
+    def stage_report(self):
+        """One line of the slowest stages, for the log."""
+        return ", ".join(f"{stage} {seconds:.2f}s"
+                         for stage, seconds in sorted(self.seconds.items(), key=lambda item: -item[1]))
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.summary(), indent=2))
+
+    def write_prometheus(self, path):
+        summary = self.summary()
+        app = summary["app"]
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in {"app": app, **labels}.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        metric("converter_run_duration_seconds", "Wall time of the most recent run.",
+               [({}, summary["duration_seconds"])])
+        metric("converter_run_stage_seconds", "Seconds spent in each stage in the most recent run.",
+               [({"stage": stage}, values["seconds"]) for stage, values in summary["stages"].items()])
+        metric("converter_run_stage_calls", "Times each stage ran in the most recent run.",
+               [({"stage": stage}, values["calls"]) for stage, values in summary["stages"].items()])
+        metric("converter_run_items", "Files, pages, bytes, rows and records handled in the most recent run.",
+               [({"item": name}, value) for name, value in summary["totals"].items()])
+        if summary["peak_rss_bytes"] is not None:
+            metric("converter_run_peak_rss_bytes", "Peak resident memory of the converter process.",
+                   [({}, summary["peak_rss_bytes"])])
+        metric("converter_run_success", "1 if the most recent run succeeded, else 0.",
+               [({}, 1 if summary["outcome"] == "success" else 0)])
+        metric("converter_run_timestamp_seconds", "Unix time the most recent run started.",
+               [({}, round(self.started_at.timestamp(), 3))])
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+
+def _write_atomic(path, content):
+    # Readers (such as node_exporter's textfile collector) never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def metrics_path_for(output_path):
+    """Default run summary path: the output file's name with .metrics.json."""
+    return os.path.splitext(output_path)[0] + ".metrics.json"
@@ -0,0 +1,120 @@
+"""Polling watch of an inbox folder, and a manifest of the files already processed."""
+import json
+import os
+import time
+from datetime import datetime
+
+
+class ProcessedManifest:
+    """Append-only JSON-lines record of processed files, keyed by content digest.
+
+    Each entry is flushed to disk before add() returns, so after a restart
+    every file recorded here is known to be done, whatever its name now is.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.digests = set()
+        self._needs_newline = False
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    self._needs_newline = not line.endswith("\n")
+                    try:
+                        self.digests.add(json.loads(line)["digest"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # a line cut short when the process was killed
+
+    def __contains__(self, digest):
+        return digest in self.digests
+
+    def __len__(self):
+        return len(self.digests)
+
+    def add(self, digest, **info):
+        entry = {"digest": digest, "processed_at": datetime.now().isoformat(timespec="seconds"), **info}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            if self._needs_newline:
+                f.write("\n")
+                self._needs_newline = False
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.digests.add(digest)
+
+
+class FolderWatcher:
+    """Polls a folder and reports each matching file once it has finished arriving.
+
+    A file is ready when its size and modification time have not changed for
+    settle_seconds and it can be opened for reading (on Windows the writer
+    holds it locked). `is_complete(path)`, if given, is a further check such
+    as a PDF trailer; a file that is stable but never passes it is reported
+    after give_up_seconds so it still gets processed (and its error logged).
+    A file that is modified after being reported is reported again.
+    """
+
+    def __init__(self, folder, extensions, settle_seconds=3.0, is_complete=None, give_up_seconds=300.0):
+        self.folder = folder
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.settle_seconds = settle_seconds
+        self.is_complete = is_complete
+        self.give_up_seconds = give_up_seconds
+        self.pending = {}    # path -> ((size, mtime_ns), stable since)
+        self.reported = {}   # path -> (size, mtime_ns) when reported
+
+    def poll(self):
+        """Return the paths that became ready since the last poll, oldest first."""
+        now = time.monotonic()
+        ready = []
+        present = set()
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(self.extensions):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue  # removed while scanning
+                path = entry.path
+                signature = (stat.st_size, stat.st_mtime_ns)
+                present.add(path)
+                if self.reported.get(path) == signature:
+                    continue
+                seen = self.pending.get(path)
+                if seen is None or seen[0] != signature:
+                    # New or still being written: wait for it to settle
+                    self.pending[path] = (signature, now)
+                    continue
+                stable_for = now - seen[1]
+                if stable_for < self.settle_seconds or not self._readable(path):
+                    continue
+                if (self.is_complete is not None and stable_for < self.give_up_seconds
+                        and not self.is_complete(path)):
+                    continue
+                ready.append((stat.st_mtime_ns, path))
+                self.reported[path] = signature
+                del self.pending[path]
+
+        for path in list(self.pending):
+            if path not in present:
+                del self.pending[path]
+        for path in list(self.reported):
+            if path not in present:
+                del self.reported[path]
+        return [path for _, path in sorted(ready)]
+
+    def retry(self, path):
+        """Report `path` again (after it settles) on a later poll."""
+        self.reported.pop(path, None)
+
+    @staticmethod
+    def _readable(path):
+        try:
+            with open(path, "rb"):
+                return True
+        except OSError:
+            return False